@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# benchmark the quality/runtime trade-off of limiting the candidate nodes (place(..., candidate_limit=k)) compared to
+# considering all delay-feasible nodes on all bundled topologies; node resources are scarce by default, such that the
+# search has to widen and some instances cannot be placed without over-subscription (where the limit approximates)
+# run from the project root
+import argparse
+import glob
+import os
+import random
+import time
+
+import yaml
+from bjointsp.main import place
+from bjointsp.read_write import reader
+from common import synthetic_sources
+
+
+# return the objective value (None if the placement failed) and runtime of placing the sources with the candidate limit
+def run(network_file, template, sources, args, candidate_limit):
+    random.seed(0)		# place picks its seed randomly
+    start = time.time()
+    result = place(network_file, template, sources, source_template_object=True, cpu=args.cpu, mem=args.mem,
+                   dr=args.dr, write_result=False, print_best=False, logging_level=None,
+                   candidate_limit=candidate_limit)
+    runtime = time.time() - start
+    if result is None:
+        return None, runtime
+    return result["metrics"]["obj_value"], runtime
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the candidate limit on all bundled topologies")
+    parser.add_argument("--networks", nargs="+", default=sorted(glob.glob("parameters/networks/*.graphml")))
+    parser.add_argument("--template", default="parameters/templates/fw3chain.yaml", help="Template file")
+    parser.add_argument("--limits", type=int, nargs="+", default=[1, 4, 16], help="Candidate limits")
+    parser.add_argument("--sources", type=int, default=20, help="Number of sources")
+    parser.add_argument("--flows", type=int, default=2, help="Flows per source")
+    parser.add_argument("--cpu", type=int, default=2, help="CPU per node")
+    parser.add_argument("--mem", type=int, default=2, help="Memory per node")
+    parser.add_argument("--dr", type=int, default=50, help="Data rate per link")
+    args = parser.parse_args()
+
+    with open(args.template) as f:
+        template = yaml.safe_load(f)
+
+    print("{:<24} {:>6} {:>6} {:>16} {:>10} {:>10} {:>8}".format("network", "nodes", "limit", "obj. value",
+                                                                  "rel. obj.", "runtime", "speedup"))
+    for network_file in args.networks:
+        node_ids = reader.read_network(network_file, args.cpu, args.mem, args.dr)[0].ids
+        sources = synthetic_sources(node_ids, args.sources, args.flows, seed=len(node_ids))
+        name = os.path.basename(network_file)[:-len(".graphml")]
+
+        base_obj, base_time = run(network_file, template, sources, args, None)
+        print("{:<24} {:>6} {:>6} {:>16} {:>10} {:>9.2f}s {:>8}".format(
+            name, len(node_ids), "all", "failed" if base_obj is None else "{:.0f}".format(base_obj), "", base_time, ""))
+        for limit in args.limits:
+            obj_value, runtime = run(network_file, template, sources, args, limit)
+            relative = ""
+            if obj_value is not None and base_obj is not None:
+                relative = "{:.3f}".format(obj_value / base_obj)
+            print("{:<24} {:>6} {:>6} {:>16} {:>10} {:>9.2f}s {:>7.1f}x".format(
+                name, len(node_ids), limit, "failed" if obj_value is None else "{:.0f}".format(obj_value), relative,
+                runtime, base_time / runtime))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# check that the all-pairs shortest path engines return exactly the same (path, weight, delay) for every pair of nodes
+# as the previous floyd-warshall, which built each path by joining the two paths via the intermediate node when it was
+# used (with equal weights, the chosen paths depend on this), on all bundled topologies and different link data rates
+# run from the project root; exits with status 1 if any entry differs
+import argparse
+import glob
+import math
+import os
+import random
+import sys
+
+from bjointsp.heuristic import shortest_paths as sp
+from bjointsp.network.links import Links
+from bjointsp.read_write import reader
+
+
+# previous floyd-warshall (before the shortest paths were stored as matrices) as reference
+def reference_shortest_paths(nodes, links):
+    shortest_paths = {}		# key: (src, dest), value: (path, weight, delay)
+
+    # initialize shortest paths
+    link_ids = set(links.ids)
+    for v1 in nodes.ids:
+        for v2 in nodes.ids:
+            # path from node to itself has weight 0
+            if v1 == v2:
+                shortest_paths[(v1, v2)] = ([v1, v2], 0)
+            # path via direct link
+            elif (v1, v2) in link_ids:
+                shortest_paths[(v1, v2)] = ([v1, v2], links.weight((v1, v2)))
+            # other paths are initialized with infinite weight
+            else:
+                shortest_paths[(v1, v2)] = ([v1, v2], math.inf)
+
+    # indirect paths via intermediate node k
+    for k in nodes.ids:
+        for v1 in nodes.ids:
+            for v2 in nodes.ids:
+                # use k if it reduces the path weight
+                if shortest_paths[(v1, v2)][1] > shortest_paths[(v1, k)][1] + shortest_paths[(k, v2)][1]:
+                    # new path via intermediate node k (when adding the two paths, k is excluded from the second path)
+                    new_path = shortest_paths[(v1, k)][0] + shortest_paths[(k, v2)][0][1:]
+                    new_weight = shortest_paths[(v1, k)][1] + shortest_paths[(k, v2)][1]
+                    shortest_paths[(v1, v2)] = (new_path, new_weight)
+
+    return {key: (tuple(path), weight, sp.path_delay(links, path)) for key, (path, weight) in shortest_paths.items()}
+
+
+# return the number of pairs whose (path, weight, delay) differs from the reference
+def mismatches(reference, shortest_paths):
+    return sum(1 for key, value in reference.items() if shortest_paths[key] != value)
+
+
+# return the links with random data rates between 1 and max_dr (same dr in both directions)
+def random_dr(links, max_dr, seed):
+    rand = random.Random(seed)
+    dr = {}
+    for (v1, v2) in links.ids:
+        dr[(v1, v2)] = dr[(v2, v1)] if (v2, v1) in dr else rand.randint(1, max_dr)
+    return Links(links.ids, dr, links.delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the shortest path engines against the previous floyd-warshall")
+    parser.add_argument("--networks", nargs="+", default=sorted(glob.glob("parameters/networks/*.graphml")))
+    parser.add_argument("--dr", type=int, nargs="+", default=[1, 20, 50], help="Uniform link data rates")
+    parser.add_argument("--random-dr", type=int, default=10, help="Max. random link data rate (0 to skip)")
+    parser.add_argument("--engines", nargs="+", default=[sp.PYTHON, sp.NUMPY], help="Engines to check")
+    args = parser.parse_args()
+
+    print("{:<26} {:>10} {:>8} {:>8} {:>10}".format("network", "dr", "engine", "pairs", "mismatches"))
+    failed = False
+    for network_file in args.networks:
+        name = os.path.basename(network_file)[:-len(".graphml")]
+        variants = []
+        for dr in args.dr:
+            variants.append((str(dr), *reader.read_network(network_file, cpu=1, mem=1, dr=dr)))
+        if args.random_dr > 0:
+            nodes, links = reader.read_network(network_file, cpu=1, mem=1, dr=1)
+            variants.append(("1-{}".format(args.random_dr), nodes, random_dr(links, args.random_dr, seed=len(name))))
+
+        for dr, nodes, links in variants:
+            reference = reference_shortest_paths(nodes, links)
+            for engine in args.engines:
+                num_mismatches = mismatches(reference, sp.all_pairs_shortest_paths(nodes, links, engine))
+                failed |= num_mismatches > 0
+                print("{:<26} {:>10} {:>8} {:>8} {:>10}".format(name, dr, engine, len(reference), num_mismatches))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+# synthetic inputs shared by the benchmarks, such that they generate comparable networks and sources
+import random
+
+import networkx as nx
+from bjointsp.network.links import Links
+from bjointsp.network.nodes import Nodes
+
+
+# create a connected, sparse synthetic network (small world) with random link data rates and delays
+def synthetic_network(num_nodes, seed):
+    rand = random.Random(seed)
+    network = nx.connected_watts_strogatz_graph(num_nodes, 4, 0.1, seed=seed)
+    node_ids = ["pop{}".format(v) for v in network.nodes]
+    nodes = Nodes(node_ids, {v: 10 for v in node_ids}, {v: 10 for v in node_ids})
+    link_ids, link_dr, link_delay = [], {}, {}
+    for v1, v2 in network.edges:
+        dr, delay = rand.randint(10, 100), rand.randint(1, 20)
+        for link in [("pop{}".format(v1), "pop{}".format(v2)), ("pop{}".format(v2), "pop{}".format(v1))]:
+            link_ids.append(link)
+            link_dr[link] = dr
+            link_delay[link] = delay
+    return nodes, Links(link_ids, link_dr, link_delay)
+
+
+# create a source at each of num_sources random nodes, each with num_flows flows with random data rates
+# (input format of reader.read_sources)
+def synthetic_sources(node_ids, num_sources, num_flows, seed):
+    rand = random.Random(seed)
+    locations = rand.sample(list(node_ids), min(num_sources, len(node_ids)))
+    return [{"node": v, "vnf": "vnf_user",
+             "flows": [{"id": "f{}_{}".format(s, k), "data_rate": rand.randint(1, 5)} for k in range(num_flows)]}
+            for s, v in enumerate(locations)]
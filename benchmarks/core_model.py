@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# memory/throughput micro-benchmark of the core model (instances, edges, flows, arcs, components, templates) on a
+# scenario with many flows: memory of the flows and the embedded overlay, runtime of the initial solution, and lookups
+# in dicts keyed by model objects (hashing and comparing them)
+# run from the project root; compare the results of different revisions, e.g., by running it in a git worktree
+import argparse
+import pickle
+import time
+import tracemalloc
+
+import bjointsp.objective as objective
+from bjointsp.heuristic import heuristic
+from bjointsp.heuristic import shortest_paths as sp
+from bjointsp.heuristic.context import SolverContext
+from bjointsp.read_write import reader
+from common import synthetic_sources
+
+
+# return the overlays of the initial solution and the runtime
+def initial_solution(nodes, links, shortest_paths, template, sources):
+    ctx = SolverContext(nodes, links, shortest_paths, set(), objective.COMBINED, seed=0)
+    start = time.time()
+    overlays = heuristic.solve(ctx, [template], {}, sources, [])
+    return overlays, time.time() - start
+
+
+# return the number of lookups per second (in millions) for looking up all keys in the dict (repeatedly)
+def lookup_rate(keys, table, repetitions):
+    start = time.time()
+    for _ in range(repetitions):
+        for k in keys:
+            table[k]
+    return len(keys) * repetitions / (time.time() - start) / 10**6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark memory and throughput of the core model")
+    parser.add_argument("--network", default="parameters/networks/Abilene.graphml", help="Network file")
+    parser.add_argument("--template", default="parameters/templates/fw3chain.yaml", help="Template file")
+    parser.add_argument("--flows", type=int, default=1000, help="Flows per source")
+    parser.add_argument("--sources", type=int, default=10, help="Number of sources")
+    parser.add_argument("--repetitions", type=int, default=20, help="Repetitions of the lookups")
+    args = parser.parse_args()
+
+    # enough resources to embed all flows
+    nodes, links = reader.read_network(args.network, cpu=10**6, mem=10**6, dr=10**6)
+    shortest_paths = sp.all_pairs_shortest_paths(nodes, links)
+    template, source_components = reader.read_template(args.template, return_src_components=True)
+    input_sources = synthetic_sources(nodes.ids, args.sources, args.flows, seed=0)
+
+    # memory of the flows (incl. sources) and of the embedded overlay (traced separately as tracing slows down)
+    tracemalloc.start()
+    sources = reader.read_sources(input_sources, source_components, source_object=True)
+    flow_memory = tracemalloc.get_traced_memory()[0]
+    overlays, _ = initial_solution(nodes, links, shortest_paths, template, sources)
+    total_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del overlays
+
+    sources = reader.read_sources(input_sources, source_components, source_object=True)
+    overlays, runtime = initial_solution(nodes, links, shortest_paths, template, sources)
+    overlay = overlays[template]
+    flows = [f for src in sources for f in src.flows]
+    instances = list(overlay.instances)
+    edges = list(overlay.edges)
+    flow_edges = [(f, e) for f in flows for e in f.dr]
+
+    print("{} flows, {} instances, {} edges, {} flow-edge mappings".format(len(flows), len(instances), len(edges),
+                                                                            len(flow_edges)))
+    print("{:<36} {:>10.2f} MB ({:.0f} B per flow)".format("memory of flows", flow_memory / 2**20,
+                                                           flow_memory / len(flows)))
+    print("{:<36} {:>10.2f} MB".format("memory of flows and overlay", total_memory / 2**20))
+    print("{:<36} {:>10.3f} s".format("initial solution", runtime))
+
+    # lookups by flow, edge, and instance; by arc, component, and template (incl. distinct but equal copies)
+    template_copy = pickle.loads(pickle.dumps(template))
+    rates = [
+        ("flow dr by edge", lookup_rate([e for _, e in flow_edges], {e: 0 for e in edges}, args.repetitions)),
+        ("flows", lookup_rate(flows, {f: 0 for f in flows}, args.repetitions)),
+        ("instances", lookup_rate(instances, {i: 0 for i in instances}, args.repetitions)),
+        ("arcs", lookup_rate(template.arcs * 1000, {a: 0 for a in template.arcs}, args.repetitions)),
+        ("components", lookup_rate(template.components * 1000, {j: 0 for j in template.components}, args.repetitions)),
+        ("templates (equal copy)", lookup_rate([template_copy] * 1000, {template: 0}, args.repetitions)),
+    ]
+    for name, rate in rates:
+        print("{:<36} {:>10.2f} M lookups/s".format("lookup " + name, rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# benchmark the embedding loop of the heuristic: topological order maintained incrementally as a worklist vs. recomputed
+# from scratch in each step (previous implementation) on templates with many instances (sources at many nodes)
+# run from the project root
+import argparse
+import time
+
+import bjointsp.objective as objective
+from bjointsp.heuristic import heuristic
+from bjointsp.heuristic import shortest_paths as sp
+from bjointsp.heuristic.context import SolverContext
+from bjointsp.overlay.worklist import TopologicalWorklist
+from bjointsp.read_write import reader
+from common import synthetic_sources
+
+
+# previous implementation: recompute the whole topological order for each access
+class RecomputedOrder:
+    def __init__(self, overlay):
+        self.overlay = overlay
+
+    def __len__(self):
+        return len(self.overlay.topological_order())
+
+    def __getitem__(self, index):
+        return self.overlay.topological_order()[index]
+
+    def remove(self, instance):
+        pass
+
+    def update(self, instances):
+        pass
+
+
+# return the runtime of the initial solution and the resulting edges
+def initial_solution(order, nodes, links, shortest_paths, template_file, input_sources):
+    template, source_components = reader.read_template(template_file, return_src_components=True)
+    sources = reader.read_sources(input_sources, source_components, source_object=True)
+    ctx = SolverContext(nodes, links, shortest_paths, set(), objective.COMBINED, seed=0)
+    heuristic.TopologicalWorklist = order
+    start = time.time()
+    overlays = heuristic.solve(ctx, [template], {}, sources, [])
+    runtime = time.time() - start
+    heuristic.TopologicalWorklist = TopologicalWorklist
+    edges = sorted(str(e) for ol in overlays.values() for e in ol.edges)
+    num_instances = sum(len(ol.instances) for ol in overlays.values())
+    return runtime, edges, num_instances
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the embedding loop of the heuristic")
+    parser.add_argument("--network", default="parameters/networks/UsCarrier.graphml", help="Network file")
+    parser.add_argument("--templates", nargs="+", default=["parameters/templates/fw3chain.yaml",
+                                                           "parameters/templates/bidir_fw1chain.yaml"])
+    parser.add_argument("--sources", type=int, nargs="+", default=[10, 20, 40], help="Numbers of sources")
+    parser.add_argument("--flows", type=int, default=3, help="Flows per source")
+    args = parser.parse_args()
+
+    # resources are reduced such that instances cannot be shared by many sources
+    nodes, links = reader.read_network(args.network, cpu=2, mem=2, dr=50)
+    shortest_paths = sp.all_pairs_shortest_paths(nodes, links)
+
+    print("{:<28} {:>8} {:>10} {:>14} {:>12} {:>8} {:>10}".format("template", "sources", "instances", "recomputed",
+                                                                    "worklist", "speedup", "identical"))
+    for template_file in args.templates:
+        for num_sources in args.sources:
+            input_sources = synthetic_sources(nodes.ids, num_sources, args.flows, seed=num_sources)
+            old_time, old_edges, _ = initial_solution(RecomputedOrder, nodes, links, shortest_paths, template_file,
+                                                      input_sources)
+            new_time, new_edges, num_instances = initial_solution(TopologicalWorklist, nodes, links, shortest_paths,
+                                                                  template_file, input_sources)
+            print("{:<28} {:>8} {:>10} {:>13.3f}s {:>11.3f}s {:>7.1f}x {:>10}".format(
+                template_file.split("/")[-1], num_sources, num_instances, old_time, new_time, old_time / new_time,
+                str(old_edges == new_edges)))
+
+
+if __name__ == '__main__':
+    main()
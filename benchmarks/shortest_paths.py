@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# benchmark shortest path engines: numpy floyd-warshall (all pairs) vs. lazy dijkstra (only rows of used start nodes)
+# on UsCarrier and on synthetic sparse networks; run from the project root
+import argparse
+import random
+import time
+
+from bjointsp.heuristic import shortest_paths as sp
+from bjointsp.read_write import reader
+from common import synthetic_network
+
+
+def benchmark(name, nodes, links, num_starts, processes, max_fw_nodes):
+    start_nodes = random.Random(0).sample(nodes.ids, min(num_starts, len(nodes.ids)))
+
+    fw_time = None
+    if len(nodes.ids) <= max_fw_nodes:
+        start = time.time()
+        sp.all_pairs_shortest_paths(nodes, links, sp.NUMPY)
+        fw_time = time.time() - start
+
+    # lazy rows computed sequentially on first access (like during the heuristic)
+    start = time.time()
+    lazy = sp.all_pairs_shortest_paths(nodes, links, sp.DIJKSTRA)
+    for v in start_nodes:
+        lazy.delay(v, v)
+    lazy_time = time.time() - start
+
+    # same rows prefetched in parallel
+    start = time.time()
+    lazy = sp.all_pairs_shortest_paths(nodes, links, sp.DIJKSTRA)
+    lazy.prefetch(start_nodes, processes)
+    prefetch_time = time.time() - start
+
+    fw_str = "{:.3f}s".format(fw_time) if fw_time is not None else "skipped"
+    print("{:<16} {:>6} {:>7} {:>14} {:>16.3f}s {:>16.3f}s".format(name, len(nodes.ids), len(links.ids), fw_str,
+                                                                    lazy_time, prefetch_time))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark shortest path engines")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 5000], help="Synthetic network sizes")
+    parser.add_argument("--starts", type=int, default=10, help="Number of start nodes used by the lazy engine")
+    parser.add_argument("--processes", type=int, default=None, help="Processes for prefetching (default: #cores)")
+    parser.add_argument("--max-fw-nodes", type=int, default=2000, help="Skip floyd-warshall on larger networks")
+    args = parser.parse_args()
+
+    print("{:<16} {:>6} {:>7} {:>14} {:>17} {:>17}".format("network", "nodes", "links", "floyd-warshall",
+                                                            "dijkstra (lazy)", "dijkstra (pool)"))
+    nodes, links = reader.read_network("parameters/networks/UsCarrier.graphml", cpu=10, mem=10, dr=50)
+    benchmark("UsCarrier", nodes, links, args.starts, args.processes, args.max_fw_nodes)
+    for size in args.sizes:
+        nodes, links = synthetic_network(size, seed=size)
+        benchmark("synthetic", nodes, links, args.starts, args.processes, args.max_fw_nodes)
+
+
+if __name__ == '__main__':
+    main()
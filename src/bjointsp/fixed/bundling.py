@@ -0,0 +1,37 @@
+import heapq
+from bjointsp.fixed.source import Source
+from bjointsp.overlay.flow import Flow
+
+
+# aggregate the flows of each source into at most max_bundles bundles, which the heuristic maps like single flows with
+# the summed data rate, ie, all flows of a bundle are placed and routed identically; different bundles of the same
+# source may still be placed differently. sources with at most max_bundles flows are kept as they are
+# flows are assigned to the bundle with the currently lowest data rate (largest flows first) => bundles of similar dr
+# return the sources with bundled flows and dict: bundle ID -> list of (flow ID, data rate) of the bundled flows
+def bundle_flows(sources, max_bundles):
+    if max_bundles < 1:
+        raise ValueError("Number of flow bundles has to be at least 1 (not {})".format(max_bundles))
+
+    bundled_sources = []
+    bundles = {}
+    for s, src in enumerate(sources):
+        if len(src.flows) <= max_bundles:
+            bundled_sources.append(src)
+            continue
+
+        members = [[] for _ in range(max_bundles)]
+        heap = [(0, b) for b in range(max_bundles)]		# (bundle dr, bundle index)
+        # stable sort => flows with the same dr are assigned in their original order (deterministic)
+        for f in sorted(src.flows, key=lambda flow: flow.src_dr, reverse=True):
+            bundle_dr, b = heapq.heappop(heap)
+            members[b].append((f.id, f.src_dr))
+            heapq.heappush(heap, (bundle_dr + f.src_dr, b))
+
+        flows = []
+        for b in range(max_bundles):
+            bundle_id = "bundle:{}:{}".format(s, b)
+            bundles[bundle_id] = members[b]
+            flows.append(Flow(bundle_id, sum(dr for _, dr in members[b])))
+        bundled_sources.append(Source(src.location, src.component, flows))
+
+    return bundled_sources, bundles
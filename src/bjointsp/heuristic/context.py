@@ -0,0 +1,31 @@
+import random
+from bjointsp.heuristic.evaluator import ObjectiveEvaluator
+
+
+# state of a single placement, passed to all functions of the heuristic, the improvement, and the controller (instead of
+# module-level globals); the network and shortest paths are only read and may be shared by concurrent placements, e.g.,
+# in different threads, each with its own context
+# optionally, candidate_limit limits the nodes considered for new instances (see heuristic.find_best_node)
+class SolverContext:
+    def __init__(self, nodes, links, shortest_paths, prev_instances, obj, seed=None, candidate_limit=None):
+        if candidate_limit is not None and candidate_limit < 1:
+            raise ValueError("Candidate limit has to be at least 1 (not {})".format(candidate_limit))
+        self.nodes = nodes
+        self.links = links
+        self.shortest_paths = shortest_paths
+        self.prev_instances = prev_instances
+        self.obj = obj
+        self.evaluator = ObjectiveEvaluator(nodes, links, prev_instances, obj)
+        self.random = random.Random(seed)		# private random number generator; same seed => same placement
+        self.candidate_limit = candidate_limit
+        self.overlays = None					# overlays that are currently (re-)embedded by the heuristic
+
+    # return the objective value based on the specified overlays
+    # only the terms of overlays that changed since their last evaluation are recomputed
+    def objective_value(self, overlays, print_info=False):
+        return self.evaluator.value(overlays, print_info)
+
+    # return the instances that were added or removed compared to the previous instances
+    def changed_instances(self, overlays):
+        curr_instances = {i for ol in overlays.values() for i in ol.instances}
+        return self.prev_instances ^ curr_instances
@@ -1,135 +1,55 @@
 import math
 import time
+import random
 import logging
-import bjointsp.objective as objective
+import multiprocessing
 from collections import defaultdict
 from bjointsp.heuristic import heuristic
 from bjointsp.heuristic import improvement
 from bjointsp.heuristic import shortest_paths as sp
+from bjointsp.heuristic.context import SolverContext
 from bjointsp.overlay.instance import Instance
 
 logger = logging.getLogger('bjointsp')
-# global variables for easy access by all functions
-nodes, links, prev_instances, obj = None, None, None, None
-
-
-# return dict of currently consumed node resources based on the instances of the specified overlays
-def consumed_node_resources(overlays):
-    consumed_cpu, consumed_mem = {}, {}
-    # reused instances exist in multiple overlays with diff ingoing edges-> have to allow duplicates-> use list not set
-    instances = [i for t in overlays.keys() for i in overlays[t].instances]
-    for v in nodes.ids:
-        consumed_cpu[v] = sum(i.consumed_cpu() for i in instances if i.location == v)
-        consumed_mem[v] = sum(i.consumed_mem() for i in instances if i.location == v)
-    return consumed_cpu, consumed_mem
-
-
-# return the objective value based on the specified overlays
-def objective_value(overlays, print_info=False):
-    # check delay of each edge; if too high, return math.inf for infeasible/infinity
-    edges = [e for ol in overlays.values() for e in ol.edges]
-    for e in edges:
-        for path in e.paths:
-            if sp.path_delay(links, path) > e.arc.max_delay:
-                # print("Embedding INFEASIBLE because delay of path of {} is too high".format(e))
-                logger.warning("Embedding INFEASIBLE because delay of path of {} is too high".format(e))
-                return math.inf
-
-    # calculate changed instances (compared to previous instances)
-    curr_instances = {i for ol in overlays.values() for i in ol.instances}
-    changed = prev_instances ^ curr_instances  # instances that are were added or removed
-    # record max over-subscription of node capacities
-    consumed_cpu, consumed_mem = consumed_node_resources(overlays)
-    max_cpu_over, max_mem_over = 0, 0
-    for v in nodes.ids:
-        if consumed_cpu[v] - nodes.cpu[v] > max_cpu_over:
-            max_cpu_over = consumed_cpu[v] - nodes.cpu[v]
-        if consumed_mem[v] - nodes.mem[v] > max_mem_over:
-            max_mem_over = consumed_mem[v] - nodes.mem[v]
-
-    # calculate data rate of each link and mark used links for each edge
-    consumed_dr = defaultdict(int)		# default = 0
-    link_used = {}
-    edges = [e for ol in overlays.values() for e in ol.edges]
-    for e in edges:
-        for path in e.paths:
-            # go along nodes of the path and increment data rate of each traversed link
-            for i in range(len(path) - 1):
-                # skip connections on same node without a link (both inst at same node)
-                if path[i] != path[i + 1]:
-                    # assume the edge dr is split equally among all paths (currently only 1 path per edge)
-                    consumed_dr[(path[i], path[i+1])] += e.flow_dr() / len(e.paths)
-                    link_used[(e.arc, e.source.location, e.dest.location, path[i], path[i+1])] = 1
-
-    # record max over-subscription of link capacitiy
-    max_dr_over = 0
-    for l in links.ids:
-        if consumed_dr[l] - links.dr[l] > max_dr_over:
-            max_dr_over = consumed_dr[l] - links.dr[l]
-
-    # calculate total delay over all used links (by different edges)
-    total_delay = 0
-    for key in link_used:
-        total_delay += links.delay[(key[3], key[4])]
-
-    # calculate total vnf delay of each node and add it to total_delay
-    vnf_delays = 0
-    for i in curr_instances:
-        vnf_delays += i.component.vnf_delay
-
-    # adding vnf_delay to total_delay
-    total_delay += vnf_delays
-
-    # calculate total consumed resources
-    total_consumed_cpu = sum(consumed_cpu[v] for v in nodes.ids)
-    total_consumed_mem = sum(consumed_mem[v] for v in nodes.ids)
-    total_consumed_dr = sum(consumed_dr[l] for l in links.ids)
-
-    # print objective value info
-    if print_info:
-        # print("Max over-subscription: {} (cpu), {} (mem), {} (dr)".format(max_cpu_over, max_mem_over, max_dr_over))
-        # print("Total delay: {}, Num changed instances: {}".format(total_delay, len(changed)))
-        # print("Total consumed resources: {} (cpu), {} (mem), {} (dr)".format(total_consumed_cpu, total_consumed_mem,
-        #        total_consumed_dr))
-        logger.info("Max over-subscription: {} (cpu), {} (mem), {} (dr)".format(max_cpu_over, max_mem_over,
-                                                                                max_dr_over))
-        logger.info("Total delay: {}, Num changed instances: {}".format(total_delay, len(changed)))
-        logger.info("Total consumed resources: {} (cpu), {} (mem), {} (dr)".format(total_consumed_cpu,
-                                                                                   total_consumed_mem,
-                                                                                   total_consumed_dr))
-
-    # calculate objective value; objectives & weights have to be identical to the MIP
-    # lexicographical combination of all objectives
-    if obj == objective.COMBINED:
-        w1 = 100 * 1000 * 1000  	# assuming changed instances < 100
-        w2 = 1000 * 1000  			# assuming total resource consumption < 1000
-        w3 = 1000  					# assuming total delay < 1000
-        value = w1 * (max_cpu_over + max_mem_over + max_dr_over)
-        value += w2 * len(changed)
-        value += w3 * (total_consumed_cpu + total_consumed_mem + total_consumed_dr)
-        value += total_delay
-
-    # minimize max over-subscription
-    elif obj == objective.OVER_SUB:
-        value = max_cpu_over + max_mem_over + max_dr_over
-
-    # minimize changed instances (compared to previous embedding)
-    elif obj == objective.CHANGED:
-        value = len(changed)
-
-    # minimize total resource consumption
-    elif obj == objective.RESOURCES:
-        value = total_consumed_cpu + total_consumed_mem + total_consumed_dr
-
-    # minimize total delay
-    elif obj == objective.DELAY:
-        value = total_delay
-
-    else:
-        logger.error("Objective {} unknown".format(obj))
-        raise ValueError("Objective {} unknown".format(obj))
-
-    return value
+# inputs of the improvement trajectories in worker processes (with multi-start), set when a worker process starts
+worker_inputs = None
+
+
+# run independent improvement trajectories from the same initial overlays, each with its own seed, in a process pool
+# each trajectory runs in a fresh process (maxtasksperchild=1) with its own context, such that it only depends on its
+# seed
+# return the best overlays (first seed in case of ties) and the seed and objective value of each trajectory
+def multi_start(ctx, templates, init_overlays, sources, fixed, seeds, processes=None, deadline=None):
+    logger.info("Starting {} improvement trajectories with seeds {}".format(len(seeds), seeds))
+    init_args = (ctx.nodes, ctx.links, ctx.shortest_paths, ctx.prev_instances, ctx.obj, ctx.candidate_limit, templates,
+                 init_overlays, sources, fixed, deadline)
+    with multiprocessing.Pool(processes, initializer=init_improve_worker, initargs=init_args,
+                              maxtasksperchild=1) as pool:
+        results = pool.map(improve_worker, seeds, chunksize=1)
+
+    best_overlays, best_obj_value = None, math.inf
+    start_results = []
+    for seed, obj_value, overlays in results:
+        logger.info("Trajectory with seed {}: objective value {}".format(seed, obj_value))
+        start_results.append({"seed": seed, "obj_value": obj_value})
+        if overlays is not None and (best_overlays is None or obj_value < best_obj_value):
+            best_overlays, best_obj_value = overlays, obj_value
+    return best_overlays, start_results
+
+
+def init_improve_worker(*inputs):
+    global worker_inputs
+    worker_inputs = inputs
+
+
+def improve_worker(seed):
+    nodes, links, shortest_paths, prev_instances, obj, candidate_limit = worker_inputs[:6]
+    templates, init_overlays, sources, fixed, deadline = worker_inputs[6:]
+    ctx = SolverContext(nodes, links, shortest_paths, prev_instances, obj, seed, candidate_limit)
+    overlays = improvement.improve(ctx, templates, init_overlays, sources, fixed, print_best=False, deadline=deadline)
+    if overlays is None:
+        return seed, math.inf, None
+    return seed, ctx.objective_value(overlays), overlays
 
 
 # return a dict with the total source data rate for each source component
@@ -140,15 +60,46 @@ def total_source_drs(sources):
     return src_drs
 
 
-def solve(arg_nodes, arg_links, templates, prev_overlays, sources, fixed, arg_obj, print_best=True):
-    # write global variables
-    global nodes, links, prev_instances, obj
-    nodes = arg_nodes
-    links = arg_links
+# with multi-start, run improvement trajectories for each seed in start_seeds (or for starts random seeds) in parallel
+# starting from the same initial solution; use start_processes processes (default: one per CPU) and keep the best result
+# optionally stop improving after time_budget seconds (including pre-computation) and return the best solution so far
+# all state of the placement is kept in its own context with a private random number generator initialized with seed
+# (default: random seed), such that multiple placements can run concurrently, e.g., in different threads
+# optionally, only consider the candidate_limit nodes with the lowest path weight for new instances (approximation)
+def solve(nodes, links, templates, prev_overlays, sources, fixed, obj, print_best=True, sp_engine=sp.NUMPY,
+          sp_cache=None, sp_processes=None, sp_dynamic=None, starts=None, start_seeds=None, start_processes=None,
+          time_budget=None, seed=None, candidate_limit=None):
+    solutions = solve_iter(nodes, links, templates, prev_overlays, sources, fixed, obj, print_best, sp_engine,
+                           sp_cache, sp_processes, sp_dynamic, starts, start_seeds, start_processes, time_budget, seed,
+                           candidate_limit)
+    # only the final solution (returned by the generator) is needed
+    while True:
+        try:
+            next(solutions)
+        except StopIteration as stop:
+            return stop.value
+
+
+# same as solve, but yield each new best solution (overlays, objective value, and changed instances) as it is found,
+# starting with the initial solution; with multi-start, only the initial and the final solution are yielded
+# when the generator is exhausted, it returns the same values as solve
+def solve_iter(nodes, links, templates, prev_overlays, sources, fixed, obj, print_best=True, sp_engine=sp.NUMPY,
+               sp_cache=None, sp_processes=None, sp_dynamic=None, starts=None, start_seeds=None, start_processes=None,
+               time_budget=None, seed=None, candidate_limit=None):
+    if starts is not None and starts < 1:
+        raise ValueError("Number of starts has to be at least 1 (not {})".format(starts))
+    if start_seeds is not None and len(start_seeds) == 0:
+        raise ValueError("List of start seeds must not be empty")
+    if time_budget is not None and time_budget <= 0:
+        raise ValueError("Time budget has to be positive (not {})".format(time_budget))
+    if candidate_limit is not None and candidate_limit < 1:
+        raise ValueError("Candidate limit has to be at least 1 (not {})".format(candidate_limit))
+
     # copy previous instances (attributes like edges_in etc are not needed and not copied)
     prev_instances = {Instance(i.component, i.location, i.src_flows) for ol in prev_overlays.values()
                       for i in ol.instances}
-    obj = arg_obj
+    if seed is None:
+        seed = random.randint(0, 9999)
 
     # print input
     # print("Templates:", *templates, sep=" ")
@@ -158,12 +109,24 @@ def solve(arg_nodes, arg_links, templates, prev_overlays, sources, fixed, arg_ob
 
     # pre-computation of shortest paths
     start_init = time.time()
-    shortest_paths = sp.all_pairs_shortest_paths(nodes, links)
+    deadline = None
+    if time_budget is not None:
+        deadline = start_init + time_budget
+    # repair the shortest paths of a previous call if possible; else compute them anew (or load them from the cache)
+    if sp_dynamic is not None:
+        shortest_paths = sp_dynamic.get(nodes, links)
+    else:
+        shortest_paths = sp.all_pairs_shortest_paths(nodes, links, sp_engine, sp_cache)
+    # with lazily computed shortest paths, optionally compute the paths from all sources in parallel upfront
+    if isinstance(shortest_paths, sp.LazyShortestPaths) and sp_processes is not None:
+        shortest_paths.prefetch({src.location for src in sources}, sp_processes)
     init_time = time.time() - start_init
     # print("Time for pre-computation of shortest paths: {}s\n".format(init_time))
     logger.info("Time for pre-computation of shortest paths: {}s\n".format(init_time))
+    ctx = SolverContext(nodes, links, shortest_paths, prev_instances, obj, seed, candidate_limit)
 
     start_heuristic = time.time()
+    start_results = []		# seed and objective value of each improvement trajectory (with multi-start)
     # get total source data rate for each source component (for sorting the templates later)
     src_drs = defaultdict(int)  # default = 0
     for src in sources:
@@ -176,11 +139,11 @@ def solve(arg_nodes, arg_links, templates, prev_overlays, sources, fixed, arg_ob
     # initial solution
     # print("\n----- Initial solution -----")
     logger.info("----- Initial solution -----")
-    overlays = heuristic.solve(arg_nodes, arg_links, templates, prev_overlays, sources, fixed, shortest_paths)
+    overlays = heuristic.solve(ctx, templates, prev_overlays, sources, fixed)
     if overlays is None:
         runtime = time.time() - start_heuristic
-        return init_time, runtime, math.inf, None, None
-    obj_value = objective_value(overlays)
+        return init_time, runtime, math.inf, None, None, start_results
+    obj_value = ctx.objective_value(overlays)
     # print("Objective value of initial solution: {}".format(obj_value))
     # print("Runtime for initial solution: {}".format(time.time() - start_heuristic))
     logger.info("Objective value of initial solution: {}".format(obj_value))
@@ -190,25 +153,41 @@ def solve(arg_nodes, arg_links, templates, prev_overlays, sources, fixed, arg_ob
     if len(nodes.ids) > 1:		# doesn't work for networks with just 1 node
         # print("\n----- Iterative improvement -----")
         logger.info("----- Iterative improvement -----")
-        overlays = improvement.improve(arg_nodes, arg_links, templates, overlays, sources, fixed, shortest_paths,
-                                       print_best=print_best)
+        if starts is not None and start_seeds is None:
+            start_seeds = [ctx.random.randint(0, 9999) for _ in range(starts)]
+        if start_seeds is None:
+            # the first solution is the initial solution
+            for overlays, obj_value in improvement.improve_iter(ctx, templates, overlays, sources, fixed, deadline):
+                if overlays is not None:
+                    yield overlays, obj_value, ctx.changed_instances(overlays)
+        else:
+            yield overlays, obj_value, ctx.changed_instances(overlays)
+            overlays, start_results = multi_start(ctx, templates, overlays, sources, fixed, start_seeds,
+                                                  start_processes, deadline)
+            if overlays is not None:
+                yield overlays, ctx.objective_value(overlays), ctx.changed_instances(overlays)
+        # print the final overlays of both single- and multi-start improvement
+        if print_best and overlays is not None:
+            print("Best overlays:")
+            for ol in overlays.values():
+                ol.print()
         # None = failure to place. shouldn't happen (unless there's no way to find a placement)
         if overlays is None:
             runtime = time.time() - start_heuristic
-            return init_time, runtime, math.inf, None, None
-        obj_value = objective_value(overlays)
+            return init_time, runtime, math.inf, None, None, start_results
+        obj_value = ctx.objective_value(overlays)
         runtime = time.time() - start_heuristic
         # print("Objective value after improvement: {}".format(obj_value))
         # print("Heuristic runtime: {}s".format(runtime))
         logger.info("Objective value after improvement: {}".format(obj_value))
         logger.info("Heuristic runtime: {}s".format(runtime))
     else:
+        yield overlays, obj_value, ctx.changed_instances(overlays)
         runtime = time.time() - start_heuristic
         # print("Skip iterative improvement for network with just 1 node")
         logger.info("Skip iterative improvement for network with just 1 node")
 
     # calculate changed instances for writing result
-    curr_instances = {i for ol in overlays.values() for i in ol.instances}
-    changed = prev_instances ^ curr_instances  # instances that were added or removed
+    changed = ctx.changed_instances(overlays)
 
-    return init_time, runtime, obj_value, changed, overlays
+    return init_time, runtime, obj_value, changed, overlays, start_results
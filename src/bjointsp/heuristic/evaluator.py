@@ -0,0 +1,163 @@
+import math
+import logging
+from collections import OrderedDict
+import numpy as np
+import bjointsp.objective as objective
+from bjointsp.heuristic import shortest_paths as sp
+from bjointsp.network.links import LinkIncidence
+
+
+logger = logging.getLogger('bjointsp')
+
+
+# return the max. positive value of the array as python number or 0 (int) if no value is positive (like the loops over
+# all nodes or links before)
+def max_over(array):
+    over = np.max(array, initial=0).item()
+    return over if over > 0 else 0
+
+
+# return the values (node ID: value) as array ordered like nodes.ids; the array is integer if all values are integers
+# such that the sums and maxima have the same type as when adding up the values in python
+def node_array(nodes, values):
+    dtype = np.int64 if all(isinstance(x, int) for x in values.values()) else np.float64
+    array = np.zeros(len(nodes.ids), dtype=dtype)
+    for v, x in values.items():
+        if v in nodes.index:
+            array[nodes.index[v]] = x
+    return array
+
+
+# objective terms of a single overlay, which are combined with the terms of the other overlays
+# consumed resources are arrays ordered like nodes.ids and links.ids
+class OverlayTerms:
+    def __init__(self, overlay, nodes, incidence, links):
+        # first edge with a path exceeding the arc's max delay (None if all edges are feasible)
+        self.infeasible_edge = None
+        for e in overlay.edges:
+            if any(sp.path_delay(links, path) > e.arc.max_delay for path in e.paths):
+                self.infeasible_edge = e
+                break
+
+        self.instances = tuple(overlay.instances)
+        # consumed node resources from the overlay's ledger (only nodes with instances) and link data rates of all edges
+        self.node_cpu = node_array(nodes, overlay.ledger.node_cpu)
+        self.node_mem = node_array(nodes, overlay.ledger.node_mem)
+        self.link_dr = incidence.load(overlay.edges)
+
+        # indices of used links for each edge (identified by its arc and the locations of its instances)
+        self.link_used = {(e.arc, e.source.location, e.dest.location): incidence.edge_links(e) for e in overlay.edges}
+
+
+# evaluate the objective value of overlays and cache the terms of each overlay
+# the terms only have to be recomputed for overlays that changed since they were last evaluated (tracked by the state
+# of their resource ledgers), e.g., the one overlay that was re-embedded in an iteration of the improvement
+class ObjectiveEvaluator:
+    def __init__(self, nodes, links, prev_instances, obj, cache_size=64):
+        self.nodes = nodes
+        self.links = links
+        self.prev_instances = prev_instances
+        self.obj = obj
+        self.node_cpu = nodes.cpu.array
+        self.node_mem = nodes.mem.array
+        self.incidence = LinkIncidence(links)
+        self.cache_size = cache_size
+        self.terms = OrderedDict()		# ledger state: terms of an overlay in this state (least recently used first)
+
+    # return the (cached) terms of the specified overlay
+    def overlay_terms(self, overlay):
+        state = overlay.ledger.state
+        if state in self.terms:
+            self.terms.move_to_end(state)
+        else:
+            self.terms[state] = OverlayTerms(overlay, self.nodes, self.incidence, self.links)
+            if len(self.terms) > self.cache_size:
+                self.terms.popitem(last=False)
+        return self.terms[state]
+
+    # return the objective value based on the specified overlays
+    def value(self, overlays, print_info=False):
+        terms = [self.overlay_terms(ol) for ol in overlays.values()]
+
+        # check delay of each edge; if too high, return math.inf for infeasible/infinity
+        for t in terms:
+            if t.infeasible_edge is not None:
+                # print("Embedding INFEASIBLE because delay of path of {} is too high".format(t.infeasible_edge))
+                logger.warning("Embedding INFEASIBLE because delay of path of {} is too high".format(t.infeasible_edge))
+                return math.inf
+
+        # calculate changed instances (compared to previous instances)
+        curr_instances = {i for t in terms for i in t.instances}
+        changed = self.prev_instances ^ curr_instances  # instances that are were added or removed
+
+        # record max over-subscription of node capacities
+        # reused instances exist in multiple overlays with diff ingoing edges-> consumption is counted in each overlay
+        consumed_cpu = sum((t.node_cpu for t in terms), np.zeros(len(self.node_cpu), dtype=np.int64))
+        consumed_mem = sum((t.node_mem for t in terms), np.zeros(len(self.node_mem), dtype=np.int64))
+        max_cpu_over = max_over(consumed_cpu - self.node_cpu)
+        max_mem_over = max_over(consumed_mem - self.node_mem)
+
+        # record max over-subscription of link capacitiy
+        consumed_dr = sum((t.link_dr for t in terms), np.zeros(len(self.incidence)))
+        max_dr_over = max_over(consumed_dr - self.incidence.dr)
+
+        # calculate total delay over all used links (by different edges)
+        link_used = {}
+        for t in terms:
+            link_used.update(t.link_used)
+        used = np.concatenate(list(link_used.values())) if link_used else np.zeros(0, dtype=np.intp)
+        total_delay = self.incidence.delay[used].sum().item() if len(used) > 0 else 0
+
+        # calculate total vnf delay of each node and add it to total_delay
+        vnf_delays = 0
+        for i in curr_instances:
+            vnf_delays += i.component.vnf_delay
+        total_delay += vnf_delays
+
+        # calculate total consumed resources
+        total_consumed_cpu = consumed_cpu.sum().item()
+        total_consumed_mem = consumed_mem.sum().item()
+        # the dr is split among paths (float), but is 0 (int) if no links are used at all
+        total_consumed_dr = consumed_dr.sum().item() if len(used) > 0 else 0
+
+        # print objective value info
+        if print_info:
+            logger.info("Max over-subscription: {} (cpu), {} (mem), {} (dr)".format(max_cpu_over, max_mem_over,
+                                                                                    max_dr_over))
+            logger.info("Total delay: {}, Num changed instances: {}".format(total_delay, len(changed)))
+            logger.info("Total consumed resources: {} (cpu), {} (mem), {} (dr)".format(total_consumed_cpu,
+                                                                                       total_consumed_mem,
+                                                                                       total_consumed_dr))
+
+        # calculate objective value; objectives & weights have to be identical to the MIP
+        # lexicographical combination of all objectives
+        if self.obj == objective.COMBINED:
+            w1 = 100 * 1000 * 1000  	# assuming changed instances < 100
+            w2 = 1000 * 1000  			# assuming total resource consumption < 1000
+            w3 = 1000  					# assuming total delay < 1000
+            value = w1 * (max_cpu_over + max_mem_over + max_dr_over)
+            value += w2 * len(changed)
+            value += w3 * (total_consumed_cpu + total_consumed_mem + total_consumed_dr)
+            value += total_delay
+
+        # minimize max over-subscription
+        elif self.obj == objective.OVER_SUB:
+            value = max_cpu_over + max_mem_over + max_dr_over
+
+        # minimize changed instances (compared to previous embedding)
+        elif self.obj == objective.CHANGED:
+            value = len(changed)
+
+        # minimize total resource consumption
+        elif self.obj == objective.RESOURCES:
+            value = total_consumed_cpu + total_consumed_mem + total_consumed_dr
+
+        # minimize total delay
+        elif self.obj == objective.DELAY:
+            value = total_delay
+
+        else:
+            logger.error("Objective {} unknown".format(self.obj))
+            raise ValueError("Objective {} unknown".format(self.obj))
+
+        return value
@@ -1,22 +1,21 @@
 # embedding procedure
 import logging
-import math
-import random
 
+import numpy as np
 from collections import OrderedDict  # for deterministic behavior
+from bjointsp.overlay import journal
 from bjointsp.overlay.edge import Edge
+from bjointsp.overlay.flow import Flow
 from bjointsp.overlay.instance import Instance
 from bjointsp.overlay.overlay import Overlay
+from bjointsp.overlay.worklist import TopologicalWorklist
 
 logger = logging.getLogger('bjointsp')
 
-# global variables for easy access by all functions
-nodes, links, shortest_paths, overlays = None, None, None, None
-
 
 # return the outgoing arc of the specified component at the specified output in the specified direction
 def out_arc(template, component, output, direction):
-    out_arcs = [a for a in template.arcs if a.starts_at(direction, output, component)]
+    out_arcs = template.index.out_arcs(component, direction, output)
     # there has to be exactly one arc per input and output; but the arc might belong to another template
     if len(out_arcs) == 1:
         return out_arcs[0]
@@ -29,78 +28,109 @@ def out_arc(template, component, output, direction):
 
 # remove the specified instance and its in- and outgoing edges from all overlays/specified overlay
 # if the instance is stateful, also remove it from passed_stateful of all flows
-def remove_instance(instance, overlay=None):
+def remove_instance(ctx, instance, overlay=None):
     # if an overlay is specified, only remove from that overlay; else from all
     if overlay is not None:
         overlays_to_update = [overlay]
     else:
-        overlays_to_update = overlays.values()
+        overlays_to_update = ctx.overlays.values()
 
     # remove instance and associated edges from overlays_to_update and update flows
     for ol in overlays_to_update:
-        flows_to_update = [f for e in ol.edges for f in e.flows if instance in f.passed_stateful.values()]
-        for f in flows_to_update:
-            f.passed_stateful = {k: v for k, v in f.passed_stateful.items() if v != instance}
-
-        if instance in ol.instances:
-            ol.instances = [i for i in ol.instances if i != instance]
-            # print("\tRemoved instance {} from overlay of {}".format(instance, ol.template))
-            logger.info("\tRemoved instance {} from overlay of {}".format(instance, ol.template))
-
-        edges_to_remove = [e for e in ol.edges if e.source == instance or e.dest == instance]
+        # only stateful and source instances are stored in passed_stateful of flows
+        if instance.component.stateful or instance.component.source:
+            flows_to_update = [f for e in ol.edges for f in e.flows if instance in f.passed_stateful.values()]
+            for f in flows_to_update:
+                journal.save(f)
+                f.passed_stateful = {k: v for k, v in f.passed_stateful.items() if v != instance}
+
+        # the overlay's own (equal) instance references all its edges in the overlay
+        own_instance = ol.instances.get(instance.component, instance.location)
+        if own_instance is None:
+            continue
+        journal.save(ol)
+        ol.instances.remove(instance)
+        ol.ledger.remove_instance(instance)
+        # print("\tRemoved instance {} from overlay of {}".format(instance, ol.template))
+        logger.info("\tRemoved instance {} from overlay of {}".format(instance, ol.template))
+
+        edges_to_remove = [e for e in list(own_instance.edges_in.values()) + list(own_instance.edges_out.values())
+                           if e in ol.edges]
         for e in edges_to_remove:
-            remove_edge(e, overlay)
+            remove_edge(ctx, e, overlay)
 
 
 # remove the specified edge from all overlays/specified overlay and instances
-def remove_edge(edge, overlay=None):
+# only the edge's source and dest instance (or the equal instances of other overlays) reference the edge
+def remove_edge(ctx, edge, overlay=None):
     # remove mapped dr
+    edge.invalidate()
     for f in edge.flows:
+        journal.save(f)
         del f.dr[edge]
     # remove edge from specified overlay or from all (if none is specified) and update flows
-    for ol in overlays.values():
+    for ol in ctx.overlays.values():
         if ol == overlay or overlay is None:
             if edge in ol.edges:
+                journal.save(ol)
                 ol.edges.remove(edge)
-            for i in ol.instances:
-                i.edges_in = {key: e for key, e in i.edges_in.items() if e != edge}
-                i.edges_out = {key: e for key, e in i.edges_out.items() if e != edge}
+                ol.ledger.remove_edge(edge)
+            source = ol.instances.get(edge.source.component, edge.source.location)
+            if source is not None and source.edges_out.get(edge.dest) == edge:
+                journal.save(source)
+                del source.edges_out[edge.dest]
+            dest = ol.instances.get(edge.dest.component, edge.dest.location)
+            if dest is not None and dest.edges_in.get(edge.source) == edge:
+                dest.invalidate()
+                del dest.edges_in[edge.source]
+                # the ingoing data rate and thus the resource consumption changed
+                ol.ledger.update_instance(dest)
     # print("\tRemoved edge {}".format(edge))
     logger.info("\tRemoved edge {}".format(edge))
 
 
 # remove specified flow: remove mapping from/to edges, remove edges that are now "empty" (without mapped flows)
-def remove_flow(overlay, flow):
+def remove_flow(ctx, overlay, flow):
     # print("Removing outdated flow {} and corresponding edges (without other flows)".format(flow))
     logger.info("Removing outdated flow {} and corresponding edges (without other flows)".format(flow))
     for e in list(overlay.edges):  # iterate over copy as edges are removed during loop
         # remove mappings
         if flow in e.flows:
+            e.invalidate()
+            journal.save(flow)
             e.flows.remove(flow)
             del flow.dr[e]
+            overlay.ledger.update_edge(e)
+            overlay.ledger.update_instance(e.dest)
 
         # remove empty edges
         if not e.flows:
-            remove_edge(e, overlay)
+            remove_edge(ctx, e, overlay)
+
+
+# return currently consumed cpu and mem at the specified node based on the resource ledgers of all overlays
+# reused instances exist in multiple overlays with diff ingoing edges -> their consumption is counted in each overlay
+# ignore the idle cpu/mem consumption of the instances of component specified in ignore_idle
+def consumed_resources(ctx, node, ignore_idle=None):
+    consumed_cpu, consumed_mem = 0, 0
+    for ol in ctx.overlays.values():
+        cpu, mem = ol.ledger.consumed(node, ignore_idle)
+        consumed_cpu += cpu
+        consumed_mem += mem
+    return consumed_cpu, consumed_mem
 
 
 # return dict of currently consumed node resources
 # ignore the idle cpu/mem consumption of the instances of component specified in ignore_idle
-def consumed_node_resources(ignore_idle=None):
+def consumed_node_resources(ctx, ignore_idle=None):
     consumed_cpu, consumed_mem = {}, {}
-    # reused instances exist in multiple overlays with diff ingoing edges -> have to allow duplicates (use list)
-    instances = [i for t in overlays.keys() for i in overlays[t].instances]
-    for v in nodes.ids:
-        consumed_cpu[v] = sum(i.consumed_cpu(ignore_idle) for i in instances if i.location == v)
-        consumed_mem[v] = sum(i.consumed_mem(ignore_idle) for i in instances if i.location == v)
+    for v in ctx.nodes.ids:
+        consumed_cpu[v], consumed_mem[v] = consumed_resources(ctx, v, ignore_idle)
     return consumed_cpu, consumed_mem
 
 
-# return dict of nodes with enough remaining node resources (based on delta_dr and the components requirements)
-# ignoring nodes that are too far away, i.e., with a too high delay, and that are on the tabu list
-# keys: nodes, values: (remaining cpu, remaining mem)
-def candidate_nodes(start_node, arc, delta_dr, tabu=set()):
-    # increase ingoing dr: delta_dr at corresponding input, 0 elsewhere
+# return the increase of the ingoing dr of the arc's dest component: delta_dr at corresponding input, 0 elsewhere
+def delta_input_dr(arc, delta_dr):
     delta_in_dr = []
     for i in range(arc.dest.inputs + arc.dest.inputs_back):
         if arc.direction == "forward" and i == arc.dest_in:
@@ -109,64 +139,159 @@ def candidate_nodes(start_node, arc, delta_dr, tabu=set()):
             delta_in_dr.append(delta_dr)
         else:
             delta_in_dr.append(0)
+    return delta_in_dr
+
+
+# remaining cpu and mem of all nodes allowed for the dest component of an arc from the start node (in the order of
+# node ids), ignoring nodes that are too far away, i.e., with a too high delay, and that are on the tabu list
+# when mapping multiple flows along the arc, only the node of each flow's dest instance changes => update that node only
+# optionally, only consider the limit nodes with the lowest path weights and widen the search when needed (best_node)
+class ResidualCapacity:
+    def __init__(self, ctx, start_node, arc, tabu=set(), limit=None):
+        self.ctx = ctx
+        self.arc = arc
+        self.limit = limit
+        # only consider nodes that are close enough (short delay) and that are not on the tabu list for the component
+        self.nodes = [v for v in ctx.shortest_paths.reachable(start_node, arc.max_delay) if (arc.dest, v) not in tabu]
+        self.index = {v: k for k, v in enumerate(self.nodes)}
+        # node capacities (by the nodes' indices in the network) and path weights from the start node
+        node_indices = np.array([ctx.nodes.index[v] for v in self.nodes], dtype=np.intp)
+        self.cpu_cap = ctx.nodes.cpu.array[node_indices]
+        self.mem_cap = ctx.nodes.mem.array[node_indices]
+        path_indices = np.array([ctx.shortest_paths.index[v] for v in self.nodes], dtype=np.intp)
+        self.weights = ctx.shortest_paths.row(start_node)[0][path_indices]
+        self.cpu = np.zeros(len(self.nodes))
+        self.mem = np.zeros(len(self.nodes))
+
+        # only compute remaining resources of considered nodes: all or the limit nodes with the lowest path weights
+        if limit is None:
+            self.considered = np.ones(len(self.nodes), dtype=bool)
+            self.num_considered = len(self.nodes)
+            for v in self.nodes:
+                self.update(v)
+        else:
+            self.order = np.argsort(self.weights, kind="stable")		# by path weight (ties: by node order)
+            self.considered = np.zeros(len(self.nodes), dtype=bool)
+            self.num_considered = 0
+            self.widen(limit)
+
+    # consider the nodes with the next lowest path weights (up to num nodes in total) and compute their resources
+    def widen(self, num):
+        for k in self.order[self.num_considered:num].tolist():
+            self.considered[k] = True
+            self.update(self.nodes[k])
+        self.num_considered = max(self.num_considered, min(num, len(self.nodes)))
+
+    # return the num nodes with the lowest path weights (in the order of node ids)
+    def nearest(self, num):
+        return [self.nodes[k] for k in sorted(self.order[:num].tolist())]
+
+    # recompute the remaining resources of the node after the resource consumption at the node changed
+    # use currently consumed node resources without idle consumption of dest-instances (to avoid subtracting it twice)
+    def update(self, node):
+        k = self.index.get(node)
+        if k is not None and self.considered[k]:
+            consumed_cpu, consumed_mem = consumed_resources(self.ctx, node, self.arc.dest)
+            self.cpu[k] = self.cpu_cap[k] - consumed_cpu
+            self.mem[k] = self.mem_cap[k] - consumed_mem
+
+    # return boolean mask of the nodes with enough remaining node resources (based on delta_dr and the component's
+    # requirements)
+    def enough(self, delta_dr):
+        delta_in_dr = delta_input_dr(self.arc, delta_dr)
+        return (self.cpu - self.arc.dest.cpu_req(delta_in_dr) >= 0) & \
+               (self.mem - self.arc.dest.mem_req(delta_in_dr) >= 0)
+
+    # return dict of considered nodes with enough remaining node resources (based on delta_dr and the components
+    # requirements); keys: nodes, values: (remaining cpu, remaining mem)
+    def candidates(self, delta_dr):
+        enough = self.enough(delta_dr) & self.considered
+        return OrderedDict((self.nodes[k], (self.cpu[k].item(), self.mem[k].item())) for k in np.flatnonzero(enough))
+
+    # return boolean mask of the specified nodes (ignoring nodes that are not considered)
+    def mask(self, nodes):
+        mask = np.zeros(len(self.nodes), dtype=bool)
+        for v in nodes:
+            k = self.index.get(v)
+            if k is not None:
+                mask[k] = True
+        return mask
+
+    # return the node with enough remaining node resources and the lowest path weight (the first one if tied) or None
+    # if there is no such node; optionally, only consider the nodes of the specified mask
+    # if none of the considered nodes has enough resources, the search is widened by doubling the considered nodes
+    # (as the nodes with the lowest path weights are considered first, the result is the same as without a limit)
+    def best_node(self, delta_dr, mask=None):
+        while True:
+            allowed = self.enough(delta_dr) & self.considered
+            if mask is not None:
+                allowed &= mask
+            indices = np.flatnonzero(allowed)
+            if len(indices) > 0:
+                return self.nodes[indices[np.argmin(self.weights[indices])]]
+            if self.num_considered == len(self.nodes):
+                return None
+            self.widen(max(1, 2 * self.num_considered))
 
-    # get currently consumed node resources without idle consumption of dest-instances (to avoid subtracting it twice)
-    consumed_cpu, consumed_mem = consumed_node_resources(arc.dest)
-
-    # only consider nodes that are close enough (short delay) and that are not on the tabu list for the component
-    allowed_nodes = [v for v in nodes.ids if
-                     shortest_paths[(start_node, v)][2] <= arc.max_delay and (arc.dest, v) not in tabu]
 
-    # check each node and add it if it has any of the required resources remaining
-    candidates = OrderedDict()
-    for v in allowed_nodes:
-        remaining_cpu = nodes.cpu[v] - consumed_cpu[v]
-        remaining_mem = nodes.mem[v] - consumed_mem[v]
+# return dict of nodes with enough remaining node resources (based on delta_dr and the components requirements)
+# ignoring nodes that are too far away, i.e., with a too high delay, and that are on the tabu list
+# keys: nodes, values: (remaining cpu, remaining mem)
+def candidate_nodes(ctx, start_node, arc, delta_dr, tabu=set()):
+    return ResidualCapacity(ctx, start_node, arc, tabu).candidates(delta_dr)
 
-        if remaining_cpu - arc.dest.cpu_req(delta_in_dr) >= 0 and remaining_mem - arc.dest.mem_req(delta_in_dr) >= 0:
-            candidates[v] = (remaining_cpu, remaining_mem)
 
-    return candidates
+# return the node with the lowest over-subscription (sum of cpu and mem over-subscription) among the specified nodes
+# use the path weight from the start location as tie breaker (and the first node if still tied)
+def least_over_subscribed_node(ctx, start_location, nodes):
+    consumed = np.array([consumed_resources(ctx, v) for v in nodes], dtype=np.float64)
+    node_indices = np.array([ctx.nodes.index[v] for v in nodes], dtype=np.intp)
+    over_subscription = (consumed[:, 0] - ctx.nodes.cpu.array[node_indices]) + \
+                        (consumed[:, 1] - ctx.nodes.mem.array[node_indices])
+    path_weight = np.array([ctx.shortest_paths.weight(start_location, v) for v in nodes], dtype=np.float64)
+    # lexsort is stable and sorts by the last key first
+    return nodes[np.lexsort((path_weight, over_subscription))[0]]
 
 
 # return the best node to create an edge to (from a given location, along a given arc, excluding the tabu-instance)
 # FUTURE WORK: favor nodes with suitable instances -> encourage reuse of existing instances -> better objective 2
-def find_best_node(overlay, start_location, arc, delta_dr, fixed, tabu):
+# optionally, use the residual capacity shared by all flows mapped along the arc (see ResidualCapacity)
+# the delay and tabu list are applied when creating the residual capacity, the remaining checks as boolean masks
+# with a candidate limit, only the nodes with the lowest path weights are considered (see ResidualCapacity)
+def find_best_node(ctx, overlay, start_location, arc, delta_dr, fixed, tabu, residual=None):
     # candidate nodes with enough remaining node capacity
-    candidates = candidate_nodes(start_location, arc, delta_dr, tabu)
-    # print("\tCandidate nodes for component {}:".format(arc.dest))
-    logger.debug("\tCandidate nodes for component {}:".format(arc.dest))
-    for v in candidates.keys():
-        # print("\t\t{} with {}".format(v, candidates[v]))
-        logger.debug("\t\t{} with {}".format(v, candidates[v]))
+    if residual is None:
+        residual = ResidualCapacity(ctx, start_location, arc, tabu, ctx.candidate_limit)
+    if logger.isEnabledFor(logging.DEBUG):
+        candidates = residual.candidates(delta_dr)
+        # print("\tCandidate nodes for component {}:".format(arc.dest))
+        logger.debug("\tCandidate nodes for component {}:".format(arc.dest))
+        for v in candidates.keys():
+            # print("\t\t{} with {}".format(v, candidates[v]))
+            logger.debug("\t\t{} with {}".format(v, candidates[v]))
 
     # fixed instances need special treatment: cannot be added or removed => enforce reuse
+    fixed_mask = None
     if fixed:
         # print("Component {} has fixed instances, which have to be used (no new instances allowed)".format(arc.dest))
         logger.info(
             "Component {} has fixed instances, which have to be used (no new instances allowed)".format(arc.dest))
-        fixed_nodes = [i.location for i in overlay.instances if i.component == arc.dest and
-                       shortest_paths[(start_location, i.location)][2] <= arc.max_delay]
-        candidates = {node: resources for node, resources in candidates.items() if node in fixed_nodes}
+        fixed_nodes = [i.location for i in overlay.instances.of_component(arc.dest)
+                       if ctx.shortest_paths.delay(start_location, i.location) <= arc.max_delay]
+        fixed_mask = residual.mask(fixed_nodes)
 
     # check all candidate nodes and place instance at node with lowest resulting path-weight (high dr, low delay)
-    if len(candidates) > 0:
-        path_weight = OrderedDict()
-        for v in candidates.keys():
-            path_weight[v] = shortest_paths[(start_location, v)][1]
-        best_node = min(path_weight, key=path_weight.get)
+    best_node = residual.best_node(delta_dr, fixed_mask)
 
     # if no nodes have remaining capacity, choose node with lowest over-subscription (within delay bounds)
-    else:
+    if best_node is None:
         # print("No nodes with enough remaining resources. Choosing node with lowest over-subscription.")
         logger.info("No nodes enough remaining resources. Choosing node with lowest over-subscription.")
-        consumed_cpu, consumed_mem = consumed_node_resources()
-        best_node = None
-        min_over_subscription = math.inf
-        min_path_weight = math.inf  # path weight of current best node, use as tie breaker
         # only allow nodes that are close enough, i.e., with low enough delay, and that are not tabu
-        allowed_nodes = [v for v in nodes.ids if shortest_paths[(start_location, v)][2] <= arc.max_delay
-                         and (arc.dest, v) not in tabu]
+        allowed_nodes = residual.nodes
+        # with a candidate limit, only allow the nearest nodes (approximation)
+        if residual.limit is not None:
+            allowed_nodes = residual.nearest(residual.limit)
         # if fixed, only allow nodes of fixed instances => enforce reuse
         if fixed:
             allowed_nodes = fixed_nodes
@@ -174,45 +299,32 @@ def find_best_node(overlay, start_location, arc, delta_dr, fixed, tabu):
             logger.error(f"There are no allowed nodes reachable from {start_location}. "
                          f"Cannot find suitable node for placement. Stopping...")
             return None
-        for v in allowed_nodes:
-            # looking at sum of cpu and memory over-subscription to find nodes with little over-sub of both
-            over_subscription = (consumed_cpu[v] - nodes.cpu[v]) + (consumed_mem[v] - nodes.mem[v])
-            if over_subscription <= min_over_subscription:
-                path_weight = shortest_paths[(start_location, v)][1]
-                if over_subscription < min_over_subscription or path_weight < min_path_weight:
-                    best_node = v
-                    min_over_subscription = over_subscription
-                    min_path_weight = path_weight
+        best_node = least_over_subscribed_node(ctx, start_location, allowed_nodes)
 
     return best_node
 
 
 # map the specified flow (with specified flow_dr) to a possibly new edge from the start_instance
 # return whether or not successful (only fails if no placement can be computed at all)
-def map_flow2edge(overlay, start_instance, arc, flow, flow_dr, tabu):
+# optionally, use and update the residual capacity shared by all flows mapped along the arc
+def map_flow2edge(ctx, overlay, start_instance, arc, flow, flow_dr, tabu, residual=None):
     # determine if the instances of the destination component are fixed => if so, cannot place new instances
-    fixed = False
-    for i in overlay.instances:
-        if i.component == arc.dest and i.fixed:
-            fixed = True
-            break
-    best_node = find_best_node(overlay, start_instance.location, arc, flow_dr, fixed, tabu)
+    fixed = overlay.instances.has_fixed(arc.dest)
+    best_node = find_best_node(ctx, overlay, start_instance.location, arc, flow_dr, fixed, tabu, residual)
     if best_node is None:
         logger.error(f"No suitable node found. Cannot compute placement.")
         return False
 
     # if the instance at best node already exists (e.g., from forward dir), just connect to it, else create anew
     # look for existing instance
-    instance_exists = False
-    for i in overlay.instances:
-        if i.component == arc.dest and i.location == best_node:
-            instance_exists = True
-            dest_instance = i
-            break
+    dest_instance = overlay.instances.get(arc.dest, best_node)
+    instance_exists = dest_instance is not None
     # create new instance if none exists in the overlay
     if not instance_exists:
         dest_instance = Instance(arc.dest, best_node)
+        journal.save(overlay)
         overlay.instances.append(dest_instance)
+        overlay.ledger.add_instance(dest_instance)
         # print("\tAdded new instance {} at best node {} (may exist in other overlays)".format(dest_instance,
         #        best_node))
         logger.info(
@@ -228,22 +340,30 @@ def map_flow2edge(overlay, start_instance, arc, flow, flow_dr, tabu):
     # if it doesn't exist, create a new edge and assign a path (shortest path)
     if not edge_exists:
         edge = Edge(arc, start_instance, dest_instance)
+        journal.save(overlay)
         overlay.edges.append(edge)
-        edge.paths.append(shortest_paths[(start_instance.location, dest_instance.location)][0])
+        edge.paths.append(ctx.shortest_paths.path(start_instance.location, dest_instance.location))
 
-    # map flow to edge
+    # map flow to edge and update the consumed resources
+    journal.save(flow)
+    edge.invalidate()
     flow.dr[edge] = flow_dr
     edge.flows.append(flow)
+    overlay.ledger.add_edge(edge)
+    overlay.ledger.update_instance(dest_instance)
+    if residual is not None:
+        residual.update(best_node)
     # print("\tMapped flow {} (dr {}) to edge {} (new: {})".format(flow, flow_dr, edge, not edge_exists))
     logger.info("\tMapped flow {} (dr {}) to edge {} (new: {})".format(flow, flow_dr, edge, not edge_exists))
     return True
 
 
 # map out_flows to edges back to the same stateful instances that were passed in fwd direction
-def map_flows2stateful(overlay, start_instance, arc, out_flows):
+def map_flows2stateful(ctx, overlay, start_instance, arc, out_flows):
     # remove any existing mappings of flows to edges along the arc
     for e in start_instance.edges_out.values():
         if e.arc == arc:
+            e.invalidate()
             e.flows = []
 
     # add currently outgoing flows to edges back to stateful instances (create edges if necessary)
@@ -255,90 +375,123 @@ def map_flows2stateful(overlay, start_instance, arc, out_flows):
         else:
             new_edge = True
             edge = Edge(arc, start_instance, dest_inst)
-            edge.paths.append(shortest_paths[(start_instance.location, dest_inst.location)][0])
+            edge.paths.append(ctx.shortest_paths.path(start_instance.location, dest_inst.location))
+            journal.save(overlay)
             overlay.edges.append(edge)
+        journal.save(f)
+        edge.invalidate()
         f.dr[edge] = out_flows[f]
         edge.flows.append(f)
+        overlay.ledger.add_edge(edge)
         # print("\tMapped flow {} (dr {}) to edge {} (new: {}) back to same stateful instance".format(f, out_flows[f],
         #       edge, new_edge))
         logger.info(
             "\tMapped flow {} (dr {}) to edge {} (new: {}) back to same stateful instance".format(f, out_flows[f], edge,
                                                                                                   new_edge))
 
+    # update consumed resources of all edges along the arc (flows were reset and remapped) and their dest-instances
+    for e in start_instance.edges_out.values():
+        if e.arc == arc:
+            overlay.ledger.update_edge(e)
+            overlay.ledger.update_instance(e.dest)
+
+
+# map all out_flows leaving the start_instance along the arc in shuffled order: update the dr of already mapped flows
+# (in flow_mapping) and map new flows to (possibly new) edges; all new flows are mapped against one residual capacity
+# vector of the allowed nodes, which is updated after each flow (only at the flow's dest node)
+# return whether or not successful (only fails if no placement can be computed at all)
+def map_flows2edges(ctx, overlay, start_instance, arc, out_flows, flow_mapping, tabu):
+    # sort flows for determinism and reproducibility (same results with same key)
+    ordered_flows = [f for f in sorted(out_flows, key=lambda flow: flow.id)]
+    # shuffle order to achieve different order of mapping in different iterations; maintains determinism and *
+    # * reproducibility (due to same key)
+    ctx.random.shuffle(ordered_flows)
+    residual = None		# computed when mapping the first new flow
+    for f in ordered_flows:  # sort according to flow.id to ensure determinism
+        if f in flow_mapping:
+            journal.save(f)
+            flow_mapping[f].invalidate()
+            f.dr[flow_mapping[f]] = out_flows[f]  # update data rate
+            overlay.ledger.update_edge(flow_mapping[f])
+            overlay.ledger.update_instance(flow_mapping[f].dest)
+            if residual is not None:
+                residual.update(flow_mapping[f].dest.location)
+            # print("\tUpdated dr of existing flow {} (Now: {})".format(f, f.dr[flow_mapping[f]]))
+            # FUTURE WORK: maybe check if capacitiy violated => if yes, reassign flow to different edge;
+            #              but might also be fixed during iterative improvement
+        else:
+            if residual is None:
+                residual = ResidualCapacity(ctx, start_instance.location, arc, tabu, ctx.candidate_limit)
+            success = map_flow2edge(ctx, overlay, start_instance, arc, f, out_flows[f], tabu, residual)
+            # FUTURE WORK: maybe try to minimize number of edges or number of new edges by combining flows to
+            #              one edge or preferring existing edges (opj 2)
+            if not success:
+                return False
+    return True
+
 
 # update the mapping of flows leaving the start_instances along the specified edge
 # return iff successful (only fails if no placement possible at all)
-def update_flow_mapping(overlay, start_instance, arc, out_flows, tabu):
+def update_flow_mapping(ctx, overlay, start_instance, arc, out_flows, tabu):
     flow_mapping = {f: e for e in start_instance.edges_out.values() if e.arc == arc for f in e.flows}
 
     # remove outdated flows
     for f in list(flow_mapping.keys()):
         if f not in out_flows:
+            journal.save(f)
+            flow_mapping[f].invalidate()
             del f.dr[flow_mapping[f]]
             flow_mapping[f].flows.remove(f)
+            overlay.ledger.update_edge(flow_mapping[f])
+            overlay.ledger.update_instance(flow_mapping[f].dest)
             del flow_mapping[f]
             # print("\tRemoved outdated flow {} along {}".format(f, arc))
 
     # enforce return of flows to the same stateful instances as passed in fwd direction
     if arc.dest.stateful and arc.direction == "backward":
-        map_flows2stateful(overlay, start_instance, arc, out_flows)
+        map_flows2stateful(ctx, overlay, start_instance, arc, out_flows)
     # update dr of mapped flows and map new ones
-    else:
-        # sort flows for determinism and reproducibility (same results with same key)
-        ordered_flows = [f for f in sorted(out_flows, key=lambda flow: flow.id)]
-        # shuffle order to achieve different order of mapping in different iterations; maintains determinism and *
-        # * reproducibility (due to same key)
-        random.shuffle(ordered_flows)
-        for f in ordered_flows:  # sort according to flow.id to ensure determinism
-            if f in flow_mapping:
-                f.dr[flow_mapping[f]] = out_flows[f]  # update data rate
-                # print("\tUpdated dr of existing flow {} (Now: {})".format(f, f.dr[flow_mapping[f]]))
-                # FUTURE WORK: maybe check if capacitiy violated => if yes, reassign flow to different edge;
-                #              but might also be fixed during iterative improvement
-            else:
-                success = map_flow2edge(overlay, start_instance, arc, f, out_flows[f], tabu)
-                # FUTURE WORK: maybe try to minimize number of edges or number of new edges by combining flows to
-                #              one edge or preferring existing edges (opj 2)
-                if not success:
-                    return False
+    elif not map_flows2edges(ctx, overlay, start_instance, arc, out_flows, flow_mapping, tabu):
+        return False
 
     # remove empty edges
-    for e in start_instance.edges_out.values():
+    for e in list(start_instance.edges_out.values()):  # iterate over copy as edges are removed during loop
         if e.arc == arc and not e.flows:
             # print("\nRemoved empty edge {}".format(e))
             logger.info("\nRemoved empty edge {}".format(e))
-            remove_edge(e, overlay)
+            remove_edge(ctx, e, overlay)
 
     return True
 
 
 # update sources (add, rem), update source flows, reset passed_stateful of all flows
-def update_sources(overlay, sources):
+def update_sources(ctx, overlay, sources):
     # reset passed_stateful for all flows (set up to date later) and remove outdated flows
     # print("Reset passed_stateful for all flows of template {}".format(overlay.template))
     src_flows = {f for src in sources for f in src.flows}
     mapped_flows = {f for e in overlay.edges for f in e.flows} | {f for src in sources for f in src.flows}
     for f in mapped_flows:
+        journal.save(f)
         f.passed_stateful.clear()
         if f not in src_flows:
-            remove_flow(overlay, f)
+            remove_flow(ctx, overlay, f)
 
     # add/update source instances
     for src in sources:
         # get existing source instance at the location
-        src_exists = False
-        for i in overlay.instances:
-            if i.component == src.component and i.location == src.location:
-                src_exists = True
-                break
+        i = overlay.instances.get(src.component, src.location)
+        src_exists = i is not None
 
         # update or add source instance depending on whether such an instance already exists or not
         if src_exists:
             # remove outdated flows
             for f in i.src_flows:
                 if f not in src.flows:
+                    journal.save(i)
+                    journal.save(f)
                     i.src_flows.remove(f)
                     for e in f.dr:
+                        e.invalidate()
                         e.flows.remove(f)
                     f.dr.clear()
                     f.passed_stateful.clear()
@@ -349,15 +502,20 @@ def update_sources(overlay, sources):
                 if f in i.src_flows:
                     new_src_dr = f.src_dr
                     f = i.src_flows[i.src_flows.index(f)]  # get existing flow object in i.src_flows
+                    journal.save(f)
                     f.src_dr = new_src_dr
-                # else add the new flow
+                # else add a copy of the new flow (the sources' flows may still be mapped to edges of other overlays)
                 else:
+                    f = Flow(f.id, f.src_dr)
+                    journal.save(i)
                     i.src_flows.append(f)
+                journal.save(f)
                 f.passed_stateful[i.component] = i
             # print("Updated/checked src_flows of existing source instance {}".format(i))
             logger.info("Updated/checked src_flows of existing source instance {}".format(i))
         else:
             src_instance = Instance(src.component, src.location, src.flows)
+            journal.save(overlay)
             overlay.instances.append(src_instance)
             # print("Added new source instance {}".format(src_instance))
             logger.info("Added new source instance {}".format(src_instance))
@@ -369,11 +527,16 @@ def update_sources(overlay, sources):
         if len(corresponding_sources) == 0:
             # print("Remove source instance {} without corresponding source".format(src))
             logger.info("Remove source instance {} without corresponding source".format(src))
-            remove_instance(src)
+            remove_instance(ctx, src)
+
+    # source flows may still be mapped to (equal) edges of other overlays, so rebuild the ledger from scratch
+    overlay.reset_ledger()
 
 
 # create an initial solution for the provided input
-def solve(arg_nodes, arg_links, templates, prev_overlays, sources, fixed, arg_shortest_paths, tabu=set()):
+# optionally only (re-)embed the templates in scope (default: all); the overlays of all other templates are kept as they
+# are and their consumed resources are a fixed background load
+def solve(ctx, templates, prev_overlays, sources, fixed, tabu=set(), scope=None):
     # print("Previous overlays:")
     # for ol in prev_overlays.values():
     #     ol.print()
@@ -382,14 +545,8 @@ def solve(arg_nodes, arg_links, templates, prev_overlays, sources, fixed, arg_sh
     #     tabu_string += "({},{}) ".format(i[0], i[1])
     #     print("Tabu list: {}".format(tabu_string))
 
-    # write global variables
-    global nodes, links, shortest_paths, overlays
-    nodes = arg_nodes
-    links = arg_links
-    shortest_paths = arg_shortest_paths
-
-    # keep previous overlays of templates that still exist
-    overlays = {t: ol for t, ol in prev_overlays.items() if t in templates}
+    # keep previous overlays of templates that still exist (in the context for easy access by all functions)
+    overlays = ctx.overlays = {t: ol for t, ol in prev_overlays.items() if t in templates}
 
     # create empty overlays for new templates
     for t in templates:
@@ -399,34 +556,47 @@ def solve(arg_nodes, arg_links, templates, prev_overlays, sources, fixed, arg_sh
             logger.info("Created empty overlay for new template {}".format(t))
 
     # remove all instances of fixed components => curr fixed instances added again later; prev fixed instances removed
+    # only remove them from the overlays in scope, where they are added again
     fixed_components = {f.component for f in fixed}
-    fixed_instances = {i for ol in overlays.values() for i in ol.instances if i.component in fixed_components}
-    # print("Remove any existing fixed instances:", *fixed_instances, sep=" ")
-    for i in fixed_instances:
-        remove_instance(i)
+    if scope is None:
+        scope = templates
+        fixed_instances = {i for ol in overlays.values() for i in ol.instances if i.component in fixed_components}
+        # print("Remove any existing fixed instances:", *fixed_instances, sep=" ")
+        for i in fixed_instances:
+            remove_instance(ctx, i)
+    else:
+        for t in scope:
+            fixed_instances = {i for i in overlays[t].instances if i.component in fixed_components}
+            for i in fixed_instances:
+                remove_instance(ctx, i, overlays[t])
 
-    # embed templates sequentially in given order
-    for t in templates:
+    # embed templates (in scope) sequentially in given order
+    for t in [t for t in templates if t in scope]:
         # print("\n-Embedding template: {}-".format(t))
         logger.info("-Embedding template: {}-".format(t))
 
         own_sources = [src for src in sources if src.component in t.components]
-        update_sources(overlays[t], own_sources)
+        update_sources(ctx, overlays[t], own_sources)
 
         # add fixed instances that match template t's components
         for f in fixed:
             if f.component in t.components:
                 fixed_instance = Instance(f.component, f.location, fixed=True)
                 if fixed_instance not in overlays[t].instances:
+                    journal.save(overlays[t])
                     overlays[t].instances.append(fixed_instance)
+                    overlays[t].ledger.add_instance(fixed_instance)
                     # print("Added fixed instance of {} at {}".format(f.component, f.location))
                     logger.info("Added fixed instance of {} at {}".format(f.component, f.location))
 
         # iterate over all instances in topological order; start in forward direction then switch to backward
+        # the order is updated incrementally: each step only changes the ingoing edges of the instance's successors
+        order = TopologicalWorklist(overlays[t])
         i = 0
         direction = "forward"
-        while i < len(overlays[t].topological_order()):
-            instance = overlays[t].topological_order()[i]
+        while i < len(order):
+            instance = order[i]
+            successors = [e.dest for e in instance.edges_out.values()]
             # #print("Topological order:", *overlays[t].topological_order(), sep=" ")
 
             # remove unused instances (except fixed instances)
@@ -434,7 +604,9 @@ def solve(arg_nodes, arg_links, templates, prev_overlays, sources, fixed, arg_sh
                 if not instance.used(direction, overlays[t]):
                     # print("Removed unused instance {} from overlay of {}".format(instance, t))
                     logger.info("Removed unused instance {} from overlay of {}".format(instance, t))
-                    remove_instance(instance, overlays[t])
+                    remove_instance(ctx, instance, overlays[t])
+                    order.remove(instance)
+                    order.update(successors)
                     continue
 
             # switch direction at the first instance of an end component (bc outgoing not ingoing direction considered)
@@ -453,13 +625,14 @@ def solve(arg_nodes, arg_links, templates, prev_overlays, sources, fixed, arg_sh
                                  "The output is skipped".format(instance, k, direction))
                     continue
 
-                success = update_flow_mapping(overlays[t], instance, arc, out_flows[k], tabu)
+                success = update_flow_mapping(ctx, overlays[t], instance, arc, out_flows[k], tabu)
                 if not success:
                     logger.error(f"Failed to update flow mapping for arc {arc}. Stopping...")
                     return None
                 # print("Updated the flow mapping along arc {} at {}\n".format(arc, instance))
                 logger.info("Updated the flow mapping along arc {} at {}\n".format(arc, instance))
 
+            order.update(successors + [e.dest for e in instance.edges_out.values()])
             i += 1
 
         # print()
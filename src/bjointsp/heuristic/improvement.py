@@ -1,12 +1,12 @@
 import copy
-import random
+import math
+import time
 import logging
-from bjointsp.heuristic import control
 from bjointsp.heuristic import heuristic
+from bjointsp.overlay import journal
+from bjointsp.overlay.containers import InstanceCollection, EdgeCollection
 logger = logging.getLogger('bjointsp')
 
-nodes, links, shortest_paths, overlays = None, None, None, None
-
 
 # reset overlay of specified template and update flows in the overlays_to_modify
 # keep instances and edges before the specified instance (less changes, shorter runtime)
@@ -16,119 +16,193 @@ def reset_overlay(template, instance, overlays_to_modify):
     # only keep instances before the specified instance (in topological order)
     order = overlay.topological_order()
     index = order.index(instance)
-    instances_to_keep = order[:index]
+    instances_to_keep = set(order[:index])
 
     # remove other instances and associated edges:
-    overlay.instances = [i for i in overlay.instances if i in instances_to_keep]
-    overlay.edges = [e for e in overlay.edges if e.source in instances_to_keep and e.dest in instances_to_keep]
-
-    # update the in-/outgoing edges of all instances
-    for i in overlay.instances:
-        i.edges_in = {key: e for key, e in i.edges_in.items() if e in overlay.edges}
-        i.edges_out = {key: e for key, e in i.edges_out.items() if e in overlay.edges}
+    journal.save(overlay)
+    kept_edges, removed_edges = [], []
+    for e in overlay.edges:
+        if e.source in instances_to_keep and e.dest in instances_to_keep:
+            kept_edges.append(e)
+        else:
+            removed_edges.append(e)
+    overlay.instances = InstanceCollection(i for i in overlay.instances if i in instances_to_keep)
+    overlay.edges = EdgeCollection(kept_edges)
+
+    # remove the removed edges from the kept instances they connect to (only modify and journal these instances)
+    for e in removed_edges:
+        source = overlay.instances.get(e.source.component, e.source.location)
+        if source is not None and source.edges_out.get(e.dest) == e:
+            journal.save(source)
+            del source.edges_out[e.dest]
+        dest = overlay.instances.get(e.dest.component, e.dest.location)
+        if dest is not None and dest.edges_in.get(e.source) == e:
+            dest.invalidate()
+            del dest.edges_in[e.source]
 
     # update flows
     flows = [f for i in overlay.instances if i.src_flows for f in i.src_flows]
     for f in flows:
-        f.dr = {e:dr for e,dr in f.dr.items() if e in overlay.edges}
-        f.passed_stateful = {j:i for j,i in f.passed_stateful.items() if i in overlay.instances}
+        dr = {e:dr for e,dr in f.dr.items() if e in overlay.edges}
+        passed_stateful = {j:i for j,i in f.passed_stateful.items() if i in overlay.instances}
+        if len(dr) != len(f.dr) or len(passed_stateful) != len(f.passed_stateful):
+            journal.save(f)
+            f.dr = dr
+            f.passed_stateful = passed_stateful
 
+    # consumed resources are recomputed for the remaining instances and edges
+    overlay.reset_ledger()
 
-# iteratively improve the specified overlays
-def improve(arg_nodes, arg_links, templates, arg_overlays, sources, fixed, arg_shortest_paths, print_best=True):
-    # write global variables
-    global nodes, links, shortest_paths, overlays
-    nodes = arg_nodes
-    links = arg_links
-    shortest_paths = arg_shortest_paths
-    overlays = arg_overlays
 
-    # three different solutions (overlays): incumbent, modified (by current iteration), best
-    best_overlays = copy.deepcopy(overlays)
-    incumbent_overlays = copy.deepcopy(overlays)
-
-    # outer loop: iteratively improve the overlays
-    total_outer_iterations = 0
-    unsuccessful_iterations = 0			# unsuccessful = best solution not improved; iteration = outer loop (modify all)
-    max_unsuccessful_iterations = 20
-    while unsuccessful_iterations < max_unsuccessful_iterations:
-        total_outer_iterations += 1
-        unsuccessful_iterations += 1
-
-        # reset to incumbent solution before next modifications (only once per outer loop iteration)
-        modified_overlays = copy.deepcopy(incumbent_overlays)
-
-        # inner loop: modify templates' overlays in predefined order
-        # pick instance of each overlay, add it to tabu-list, reset overlay, and solve anew
-        # FUTURE WORK: smarter than random? e.g., such instances that could be used in both direction but aren't?
-        for t in templates:
-            # an overlay may be deleted if it has no source -> skip the template and its overlay
-            if t not in modified_overlays.keys():
-                continue
-            ol = modified_overlays[t]
-            # ol.print()
-
-            # set random instance to tabu and remove it and following instances
-            # FUTURE WORK: keep instances in tabu-list for multiple iterations?
-            tabu = set()  # set of forbidden instances tuples: (component, location)
-            # ignore source or fixed instances, which have to be at a specific location
-            non_fixed_instances = [i for i in ol.instances if not i.component.source and not i.fixed]
-            if len(non_fixed_instances) == 0:
-                # print("Skip modification of {}'s overlay because all instances are fixed".format(t))
-                logger.info("Skip modification of {}'s overlay because all instances are fixed".format(t))
-                continue
-            rand_instance = random.choice(non_fixed_instances)
-            tabu.add((rand_instance.component, rand_instance.location))
-
-            # print("\n--Iteration {}: Modifying overlay of {}--".format(total_outer_iterations, ol.template))
-            # print("Set random instance {} of {}'s overlay to tabu and rebuild overlay".format(rand_instance,
-            #        ol.template))
-            logger.info("--Iteration {}: Modifying overlay of {}--".format(total_outer_iterations, ol.template))
-            logger.info("Set random instance {} of {}'s overlay to tabu and rebuild overlay".format(rand_instance,
-                                                                                                    ol.template))
-
-            reset_overlay(ol.template, rand_instance, modified_overlays)
-            modified_overlays = heuristic.solve(nodes, links, templates, modified_overlays, sources, fixed,
-                                                shortest_paths, tabu)
-            # return failed placement back to controller. to fail in "save" way
-            if modified_overlays is None:
-                return None
-
-            # update solution
-            new_obj_value = control.objective_value(modified_overlays)
-            # print("Objective value of modified overlays: {}".format(new_obj_value))
-            logger.info("Objective value of modified overlays: {}".format(new_obj_value))
-            incumbent_obj_value = control.objective_value(incumbent_overlays)
-            if new_obj_value < incumbent_obj_value:
-                # print("\tImproved objective value -> new incumbent solution")
-                logger.info("\tImproved objective value -> new incumbent solution")
-                incumbent_overlays = copy.deepcopy(modified_overlays)
-                if new_obj_value < control.objective_value(best_overlays):
-                    # print("\tNew best solution")
-                    logger.info("\tNew best solution")
-                    best_overlays = copy.deepcopy(modified_overlays)
-                    unsuccessful_iterations = 0
-            # even update incumbent solution if it is slightly worse (50% chance)
-            elif new_obj_value <= 1.1 * incumbent_obj_value:
-                if random.random() < 0.5:
-                    # print("\tOnly slightly worse objective value; new incumbent solution")
-                    logger.info("\tOnly slightly worse objective value; new incumbent solution")
-                    incumbent_overlays = copy.deepcopy(modified_overlays)
-                else:
-                    # print("\tOnly slightly worse objective value; solution discarded")
-                    logger.info("\tOnly slightly worse objective value; solution discarded")
-            else:
-                # print("\tWorse objective value -> solution discarded after last inner loop")
-                logger.info("\tWorse objective value -> solution discarded after this iteration")
-                # keep using modified_overlays during the remainder of the inner loop
-
-    # print("\n---Heuristic finished---")
-    # print("Total outer loop iterations: {}".format(total_outer_iterations))
-    logger.info("---Heuristic finished---")
-    logger.info("Total outer loop iterations: {}".format(total_outer_iterations))
-    if print_best:
+# return the templates that are re-embedded after modifying the overlay of the specified template: the template itself
+# and all templates sharing (reused) components with it; the overlays of other templates stay unchanged
+def affected_templates(template, templates):
+    components = set(template.components)
+    return [t for t in templates if t is template or components.intersection(t.components)]
+
+
+# iteratively improve the specified overlays and return the best overlays (None if placement failed)
+# optionally stop at the deadline (time in seconds since the epoch like time.time()) and return the best overlays so far
+def improve(ctx, templates, overlays, sources, fixed, print_best=True, deadline=None):
+    best_overlays = None
+    for best_overlays, best_obj_value in improve_iter(ctx, templates, overlays, sources, fixed, deadline):
+        pass
+
+    if print_best and best_overlays is not None:
         print("Best overlays:")
         for ol in best_overlays.values():
             ol.print()
 
     return best_overlays
+
+
+# iteratively improve the specified overlays and yield the best overlays and their objective value: first the specified
+# overlays, then each new best solution; yield None (and math.inf) if placement failed
+# the yielded overlays are modified in place by later iterations: they are only valid until the next solution is
+# requested; when the improvement finishes, the overlays of the last (best) solution are restored
+# optionally stop at the deadline (time in seconds since the epoch like time.time()), which is checked before each
+# modification of an overlay (a running modification is completed)
+def improve_iter(ctx, templates, overlays, sources, fixed, deadline=None):
+    # three different solutions (overlays): incumbent, modified (by current iteration), best
+    # to avoid deep copies, only a single copy of the overlays is modified in place; all modifications are recorded in
+    # an undo journal, where the incumbent and best solution are checkpoints that modified overlays are rolled back to
+    # the objective values of the incumbent and best solution are stored with them rather than recomputed
+    modified_overlays = copy.deepcopy(overlays)
+    # the journal only records modifications while the generator runs (not while it is suspended in the caller's thread)
+    undo = journal.Journal()
+    journal.activate(undo)
+    try:
+        # templates to re-embed after modifying each template's overlay
+        scopes = {t: affected_templates(t, templates) for t in templates}
+        best = incumbent = undo.checkpoint()
+        best_overlays = incumbent_overlays = dict(modified_overlays)
+        best_obj_value = incumbent_obj_value = ctx.objective_value(modified_overlays)
+        journal.activate(None)
+        yield best_overlays, best_obj_value
+        journal.activate(undo)
+
+        # outer loop: iteratively improve the overlays
+        total_outer_iterations = 0
+        unsuccessful_iterations = 0		# unsuccessful = best solution not improved; iteration = outer loop (modify all)
+        max_unsuccessful_iterations = 20
+        while unsuccessful_iterations < max_unsuccessful_iterations and not deadline_passed(deadline):
+            total_outer_iterations += 1
+            unsuccessful_iterations += 1
+
+            # reset to incumbent solution before next modifications (only once per outer loop iteration)
+            undo.rollback(incumbent)
+            modified_overlays = dict(incumbent_overlays)
+
+            # inner loop: modify templates' overlays in predefined order
+            # pick instance of each overlay, add it to tabu-list, reset overlay, and re-embed the affected templates
+            # FUTURE WORK: smarter than random? e.g., such instances that could be used in both direction but aren't?
+            for t in templates:
+                # an overlay may be deleted if it has no source -> skip the template and its overlay
+                if t not in modified_overlays.keys():
+                    continue
+                if deadline_passed(deadline):
+                    break
+                ol = modified_overlays[t]
+                # ol.print()
+
+                # set random instance to tabu and remove it and following instances
+                # FUTURE WORK: keep instances in tabu-list for multiple iterations?
+                tabu = set()  # set of forbidden instances tuples: (component, location)
+                # ignore source or fixed instances, which have to be at a specific location
+                non_fixed_instances = [i for i in ol.instances if not i.component.source and not i.fixed]
+                if len(non_fixed_instances) == 0:
+                    # print("Skip modification of {}'s overlay because all instances are fixed".format(t))
+                    logger.info("Skip modification of {}'s overlay because all instances are fixed".format(t))
+                    continue
+                rand_instance = ctx.random.choice(non_fixed_instances)
+                tabu.add((rand_instance.component, rand_instance.location))
+
+                # print("\n--Iteration {}: Modifying overlay of {}--".format(total_outer_iterations, ol.template))
+                # print("Set random instance {} of {}'s overlay to tabu and rebuild overlay".format(rand_instance,
+                #        ol.template))
+                logger.info("--Iteration {}: Modifying overlay of {}--".format(total_outer_iterations, ol.template))
+                logger.info("Set random instance {} of {}'s overlay to tabu and rebuild overlay".format(rand_instance,
+                                                                                                        ol.template))
+
+                reset_overlay(ol.template, rand_instance, modified_overlays)
+                modified_overlays = heuristic.solve(ctx, templates, modified_overlays, sources, fixed, tabu, scopes[t])
+                # return failed placement back to controller. to fail in "save" way
+                if modified_overlays is None:
+                    journal.activate(None)
+                    yield None, math.inf
+                    return
+
+                # update solution
+                new_obj_value = ctx.objective_value(modified_overlays)
+                # print("Objective value of modified overlays: {}".format(new_obj_value))
+                logger.info("Objective value of modified overlays: {}".format(new_obj_value))
+                if new_obj_value < incumbent_obj_value:
+                    # print("\tImproved objective value -> new incumbent solution")
+                    logger.info("\tImproved objective value -> new incumbent solution")
+                    incumbent = undo.checkpoint()
+                    incumbent_overlays = dict(modified_overlays)
+                    incumbent_obj_value = new_obj_value
+                    if new_obj_value < best_obj_value:
+                        # print("\tNew best solution")
+                        logger.info("\tNew best solution")
+                        best = incumbent
+                        best_overlays = incumbent_overlays
+                        best_obj_value = new_obj_value
+                        unsuccessful_iterations = 0
+                        # earlier solutions are never restored again
+                        undo.discard(best)
+                        journal.activate(None)
+                        yield best_overlays, best_obj_value
+                        journal.activate(undo)
+                # even update incumbent solution if it is slightly worse (50% chance)
+                elif new_obj_value <= 1.1 * incumbent_obj_value:
+                    if ctx.random.random() < 0.5:
+                        # print("\tOnly slightly worse objective value; new incumbent solution")
+                        logger.info("\tOnly slightly worse objective value; new incumbent solution")
+                        incumbent = undo.checkpoint()
+                        incumbent_overlays = dict(modified_overlays)
+                        incumbent_obj_value = new_obj_value
+                    else:
+                        # print("\tOnly slightly worse objective value; solution discarded")
+                        logger.info("\tOnly slightly worse objective value; solution discarded")
+                else:
+                    # print("\tWorse objective value -> solution discarded after last inner loop")
+                    logger.info("\tWorse objective value -> solution discarded after this iteration")
+                    # keep using modified_overlays during the remainder of the inner loop
+
+        # print("\n---Heuristic finished---")
+        # print("Total outer loop iterations: {}".format(total_outer_iterations))
+        logger.info("---Heuristic finished---")
+        logger.info("Total outer loop iterations: {}".format(total_outer_iterations))
+        if deadline_passed(deadline):
+            logger.info("Stopped improvement at deadline")
+
+    # restore the best solution (also if the improvement is stopped early) and stop recording modifications
+    finally:
+        undo.rollback(best)
+        journal.activate(None)
+
+
+# return whether the deadline (if any) has passed
+def deadline_passed(deadline):
+    return deadline is not None and time.time() >= deadline
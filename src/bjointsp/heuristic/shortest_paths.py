@@ -1,8 +1,25 @@
+import bisect
+import hashlib
+import heapq
 import math
 import logging
+import multiprocessing
+import os
+import tempfile
+import numpy as np
+from bjointsp.network.links import Links
 
 logger = logging.getLogger('bjointsp')
 
+# engines for the all-pairs shortest path pre-computation
+PYTHON = "python"		# pure-python floyd-warshall (reference implementation)
+NUMPY = "numpy"			# floyd-warshall vectorized with numpy (one row/column update per intermediate node)
+DIJKSTRA = "dijkstra"	# lazy single-source dijkstra per start node, computed on first access (large sparse networks)
+ENGINES = (PYTHON, NUMPY, DIJKSTRA)
+
+# arrays in the shortest path cache; part of the network fingerprint such that caches of other formats are ignored
+CACHE_FORMAT = "weight,delay,pred,via,superseded"
+
 
 # return the delay of the specified path (= list of nodes)
 def path_delay(links, path):
@@ -19,35 +36,449 @@ def path_delay(links, path):
     return delay
 
 
-# floyd-warshall algorithm
-def all_pairs_shortest_paths(nodes, links):
-    shortest_paths = {}		# key: (src, dest), value: (path, weight, delay)
-
-    # initialize shortest paths
-    for v1 in nodes.ids:
-        for v2 in nodes.ids:
-            # path from node to itself has weight 0
-            if v1 == v2:
-                shortest_paths[(v1, v2)] = ([v1, v2], 0)
-            # path via direct link
-            elif (v1, v2) in links.ids:
-                shortest_paths[(v1, v2)] = ([v1, v2], links.weight((v1, v2)))
-            # other paths are initialized with infinite weight
+# shortest paths between all pairs of nodes, stored compactly as weight, delay, and predecessor matrices
+# rows and columns correspond to node_ids; pred[i, j] is the index of the node before j on the path from i to j
+# paths are only reconstructed when requested and are then cached as immutable tuples shared by all edges
+# with floyd-warshall, via[i, j] is the intermediate node k of the path from i to j (-1 for direct links): the path is
+# the path from i to k followed by the path from k to j, as they were when k was used (like the paths of the previous
+# floyd-warshall, which joined the two paths at that time); with equal weights, these may differ from following pred
+# superseded lists (i, j, k) for each earlier intermediate node k of the path from i to j that was replaced later
+# rows in pred_rows (e.g., repaired with dijkstra) and all rows without via are reconstructed by following pred
+class ShortestPaths:
+    def __init__(self, node_ids, weight, delay, pred, via=None, superseded=None, pred_rows=None):
+        self.node_ids = list(node_ids)
+        self.index = {v: i for i, v in enumerate(self.node_ids)}
+        self.weights = np.asarray(weight, dtype=np.float64)
+        self.delays = np.asarray(delay, dtype=np.float64)
+        self.pred = np.asarray(pred, dtype=np.int32)
+        self.via = None if via is None else np.asarray(via, dtype=np.int32)
+        self.superseded = np.zeros((0, 3), dtype=np.int32) if superseded is None else np.asarray(superseded)
+        self.earlier_vias = None	# superseded intermediate nodes in increasing order; key: (i, j), value: list of k
+        if pred_rows is None:
+            pred_rows = np.zeros(len(self.node_ids), dtype=bool)
+        self.pred_rows = pred_rows
+        self.paths = {}			# cache of reconstructed paths; key: (src, dest), value: tuple of nodes
+        self.delay_orders = {}	# cache of nodes sorted by path delay; key: src, value: (node indices, delays)
+        self.reachable_nodes = {}	# cache of reachable nodes; key: (src, max_delay), value: tuple of nodes
+
+    def __len__(self):
+        return len(self.node_ids) ** 2
+
+    def __contains__(self, key):
+        return key[0] in self.index and key[1] in self.index
+
+    def __iter__(self):
+        return ((v1, v2) for v1 in self.node_ids for v2 in self.node_ids)
+
+    # same (path, weight, delay) lookup as the dict previously returned by all_pairs_shortest_paths
+    def __getitem__(self, key):
+        return self.path(*key), self.weight(*key), self.delay(*key)
+
+    def keys(self):
+        return iter(self)
+
+    def weight(self, src, dest):
+        return self.weights.item(self.index[src], self.index[dest])
+
+    def delay(self, src, dest):
+        return self.delays.item(self.index[src], self.index[dest])
+
+    # return weights, delays, and predecessors of all paths starting at src (as arrays indexed like node_ids)
+    def row(self, src):
+        i = self.index[src]
+        return self.weights[i], self.delays[i], self.pred[i]
+
+    # return node indices sorted by the delay of their paths from src together with the sorted delays
+    def delay_order(self, src):
+        order = self.delay_orders.get(src)
+        if order is None:
+            delays = self.row(src)[1]
+            indices = np.argsort(delays, kind="stable")
+            order = (indices.tolist(), delays[indices].tolist())
+            self.delay_orders[src] = order
+        return order
+
+    # return all nodes with a path delay of at most max_delay from src (in the order of node_ids)
+    # the delay order turns this into a bisection; results are cached since max. delays are fixed per arc
+    def reachable(self, src, max_delay):
+        nodes = self.reachable_nodes.get((src, max_delay))
+        if nodes is None:
+            indices, delays = self.delay_order(src)
+            num_reachable = bisect.bisect_right(delays, max_delay)
+            nodes = tuple(self.node_ids[i] for i in sorted(indices[:num_reachable]))
+            self.reachable_nodes[(src, max_delay)] = nodes
+        return nodes
+
+    # return the shortest path from src to dest as tuple of nodes; reconstructed on first access from via or pred
+    # like floyd_warshall, the path from a node to itself and unreachable paths consist of both end points only
+    def path(self, src, dest):
+        path = self.paths.get((src, dest))
+        if path is None:
+            i, j = self.index[src], self.index[dest]
+            if self.via is None or self.pred_rows[i]:
+                indices = self.pred_path(i, j)
+            else:
+                indices = self.via_path(i, j)
+            path = tuple(self.node_ids[idx] for idx in indices)
+            self.paths[(src, dest)] = path
+        return path
+
+    # return the indices of the nodes on the path from i to j by following the predecessors back from j
+    def pred_path(self, i, j):
+        pred = self.row(self.node_ids[i])[2]
+        indices = [j]
+        if i != j:
+            while indices[-1] != i:
+                indices.append(pred.item(indices[-1]))
+        else:
+            indices.append(i)
+        return indices[::-1]
+
+    # return the intermediate node of the path from i to j as it was before node k_max was used as intermediate node
+    # (-1 if it was still the initial path); the paths are only improved by intermediate nodes in increasing order
+    def via_before(self, i, j, k_max):
+        k = self.via.item(i, j)
+        if k < k_max:
+            return k
+        if self.earlier_vias is None:
+            self.earlier_vias = {}
+            for v1, v2, earlier_k in self.superseded.tolist():
+                self.earlier_vias.setdefault((v1, v2), []).append(earlier_k)
+        earlier = self.earlier_vias.get((i, j), [])
+        num_earlier = bisect.bisect_left(earlier, k_max)
+        return earlier[num_earlier - 1] if num_earlier > 0 else -1
+
+    # return the indices of the nodes on the path from i to j by joining the paths via the intermediate nodes
+    # iteratively, with a stack of node pairs whose paths still have to be joined (as they were before the intermediate
+    # node that joins them was used); each direct link adds its end node
+    def via_path(self, i, j):
+        indices = [i]
+        pairs = [(i, j, len(self.node_ids))]
+        while pairs:
+            v1, v2, k_max = pairs.pop()
+            k = self.via_before(v1, v2, k_max)
+            if k < 0:
+                indices.append(v2)
             else:
-                shortest_paths[(v1, v2)] = ([v1, v2], math.inf)
+                pairs.append((k, v2, k))
+                pairs.append((v1, k, k))
+        return indices
+
+
+# same interface as ShortestPaths, but each row (all paths from one start node) is only computed on first access
+# using single-source dijkstra and is then kept; avoids computing all pairs on large, sparse networks
+class LazyShortestPaths(ShortestPaths):
+    def __init__(self, node_ids, links):
+        self.node_ids = list(node_ids)
+        self.index = {v: i for i, v in enumerate(self.node_ids)}
+        self.paths = {}
+        self.delay_orders = {}
+        self.reachable_nodes = {}
+        self.rows = {}			# computed rows; key: node index, value: (weights, delays, pred)
+        self.via = None			# paths always follow pred (dijkstra)
+        self.adjacency = adjacency_lists(self.index, links)
+
+    def row(self, src):
+        i = self.index[src]
+        if i not in self.rows:
+            self.rows[i] = row_arrays(*dijkstra(self.adjacency, i))
+        return self.rows[i]
+
+    def weight(self, src, dest):
+        return self.row(src)[0].item(self.index[dest])
+
+    def delay(self, src, dest):
+        return self.row(src)[1].item(self.index[dest])
+
+    # compute the rows of the specified start nodes in advance, in parallel with the specified number of processes
+    def prefetch(self, start_nodes, processes=None):
+        missing = sorted({self.index[v] for v in start_nodes} - self.rows.keys())
+        if processes == 1 or len(missing) < 2:
+            for i in missing:
+                self.rows[i] = row_arrays(*dijkstra(self.adjacency, i))
+            return
+        with multiprocessing.Pool(processes, initializer=init_dijkstra_worker, initargs=(self.adjacency,)) as pool:
+            for i, row in zip(missing, pool.map(dijkstra_worker, missing)):
+                self.rows[i] = row_arrays(*row)
+        logger.info("Prefetched shortest paths from {} start nodes".format(len(missing)))
+
+
+# shortest paths that are kept up to date for repeated calls on the same topology (same node and link IDs)
+# if only the data rate or delay of some links changed, the previous shortest paths are repaired instead of recomputed
+# if more than max_change_fraction of all links changed, the shortest paths are recomputed from scratch
+class DynamicShortestPaths:
+    def __init__(self, engine=NUMPY, cache_dir=None, max_change_fraction=0.1):
+        self.engine = engine
+        self.cache_dir = cache_dir
+        self.max_change_fraction = max_change_fraction
+        self.shortest_paths = None
+        self.topology = None		# node and link IDs of the current shortest paths
+        self.link_attr = None		# arrays of link dr and delay of the current shortest paths (ordered like link IDs)
+
+    # return shortest paths for the specified network
+    def get(self, nodes, links):
+        topology = (tuple(nodes.ids), tuple(links.ids))
+        link_attr = (links.dr.array.copy(), links.delay.array.copy())
+        if self.shortest_paths is None or topology != self.topology:
+            self.shortest_paths = all_pairs_shortest_paths(nodes, links, self.engine, self.cache_dir)
+        else:
+            # same links => same order of their arrays
+            changed = (link_attr[0] != self.link_attr[0]) | (link_attr[1] != self.link_attr[1])
+            changed_links = {links.ids[k] for k in np.flatnonzero(changed)}
+            if len(changed_links) > self.max_change_fraction * len(links.ids):
+                logger.info("{} of {} links changed. Recomputing shortest paths".format(len(changed_links),
+                                                                                       len(links.ids)))
+                self.shortest_paths = all_pairs_shortest_paths(nodes, links, self.engine, self.cache_dir)
+            elif changed_links:
+                prev_links = Links(links.ids, *self.link_attr)
+                self.shortest_paths = update_shortest_paths(self.shortest_paths, links, changed_links, prev_links)
+        self.topology = topology
+        self.link_attr = link_attr
+        return self.shortest_paths
+
+
+# return shortest paths between all pairs of nodes using the specified engine
+# if a cache directory is specified, load the shortest paths from there or compute and store them for later calls
+def all_pairs_shortest_paths(nodes, links, engine=NUMPY, cache_dir=None):
+    if engine not in ENGINES:
+        raise ValueError("Shortest path engine {} unknown. Use one of {}".format(engine, ENGINES))
+
+    if cache_dir is not None:
+        shortest_paths = load_shortest_paths(nodes, links, cache_dir)
+        if shortest_paths is not None:
+            return shortest_paths
+
+    # rows are computed on demand => nothing to pre-compute or cache
+    if engine == DIJKSTRA:
+        return LazyShortestPaths(nodes.ids, links)
+
+    if engine == PYTHON:
+        weight, delay, pred, via, superseded = floyd_warshall(nodes, links)
+    else:
+        weight, delay, pred, via, superseded = floyd_warshall_numpy(nodes, links)
+    shortest_paths = ShortestPaths(nodes.ids, weight, delay, pred, via, superseded)
+
+    if cache_dir is not None:
+        save_shortest_paths(shortest_paths, nodes, links, cache_dir)
+    return shortest_paths
+
+
+# return a hash identifying the network by its node IDs, link IDs, and link data rates and delays
+# shortest paths only depend on these attributes and can be reused for all networks with the same fingerprint
+def network_fingerprint(nodes, links):
+    fingerprint = hashlib.sha1()
+    fingerprint.update(CACHE_FORMAT.encode())
+    fingerprint.update(repr([str(v) for v in nodes.ids]).encode())
+    for l in links.ids:
+        fingerprint.update(repr((str(l[0]), str(l[1]), float(links.dr[l]), float(links.delay[l]))).encode())
+    return fingerprint.hexdigest()
+
+
+# load cached shortest paths of the network as memory-mapped arrays; return None if they are not cached (yet)
+def load_shortest_paths(nodes, links, cache_dir):
+    directory = os.path.join(cache_dir, network_fingerprint(nodes, links))
+    try:
+        weight = np.load(os.path.join(directory, "weight.npy"), mmap_mode="r")
+        delay = np.load(os.path.join(directory, "delay.npy"), mmap_mode="r")
+        pred = np.load(os.path.join(directory, "pred.npy"), mmap_mode="r")
+        via = np.load(os.path.join(directory, "via.npy"), mmap_mode="r")
+        superseded = np.load(os.path.join(directory, "superseded.npy"))
+    except (OSError, ValueError):
+        logger.info("No cached shortest paths in {}".format(directory))
+        return None
+    logger.info("Loaded cached shortest paths from {}".format(directory))
+    return ShortestPaths(nodes.ids, weight, delay, pred, via, superseded)
+
+
+# store the shortest paths of the network in the cache directory
+# files are written to a temporary directory first and then moved, such that concurrent runs never read partial files
+def save_shortest_paths(shortest_paths, nodes, links, cache_dir):
+    directory = os.path.join(cache_dir, network_fingerprint(nodes, links))
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_directory = tempfile.mkdtemp(dir=cache_dir)
+    np.save(os.path.join(tmp_directory, "weight.npy"), shortest_paths.weights)
+    np.save(os.path.join(tmp_directory, "delay.npy"), shortest_paths.delays)
+    np.save(os.path.join(tmp_directory, "pred.npy"), shortest_paths.pred)
+    np.save(os.path.join(tmp_directory, "via.npy"), shortest_paths.via)
+    np.save(os.path.join(tmp_directory, "superseded.npy"), shortest_paths.superseded)
+    try:
+        os.rename(tmp_directory, directory)
+        logger.info("Cached shortest paths in {}".format(directory))
+    # another run cached the same shortest paths in the meantime
+    except OSError:
+        for f in os.listdir(tmp_directory):
+            os.remove(os.path.join(tmp_directory, f))
+        os.rmdir(tmp_directory)
+
+
+# return shortest paths repaired after the data rate or delay of the changed links changed (same nodes and links)
+# prev_links are the links before the change
+# only rows (start nodes) whose paths are affected are recomputed with dijkstra; the previous paths are not modified
+# a row is affected if its shortest path tree contains a changed link or if a changed link is now shorter than the tree
+# rows with paths joined via intermediate nodes (floyd-warshall) may also use a changed link on a path that is not in
+# the tree (same weight) => such rows are affected if any of their paths may traverse a changed link (by its old weight)
+def update_shortest_paths(shortest_paths, links, changed_links, prev_links):
+    index = shortest_paths.index
+    changes = [(index[v1], index[v2], links.weight((v1, v2)), prev_links.weight((v1, v2)))
+               for (v1, v2) in changed_links if v1 in index and v2 in index and v1 != v2]
+
+    # lazy shortest paths: keep unaffected rows, all others are recomputed on demand
+    if isinstance(shortest_paths, LazyShortestPaths):
+        updated = LazyShortestPaths(shortest_paths.node_ids, links)
+        for i, (weight, delay, pred) in shortest_paths.rows.items():
+            if not any(pred[v2] == v1 or weight[v1] + w < weight[v2] for v1, v2, w, _ in changes):
+                updated.rows[i] = (weight, delay, pred)
+        affected = [i for i in range(len(index)) if i not in updated.rows]
+    # all pairs: recompute affected rows in (copies of) the matrices
+    else:
+        weight = np.array(shortest_paths.weights)
+        delay = np.array(shortest_paths.delays)
+        pred = np.array(shortest_paths.pred)
+        affected_rows = np.zeros(len(index), dtype=bool)
+        for v1, v2, w, prev_w in changes:
+            affected_rows |= (pred[:, v2] == v1) | (weight[:, v1] + w < weight[:, v2])
+            if shortest_paths.via is not None and prev_w < math.inf:
+                # weight of the shortest path from each row via the link to each node (relative tolerance for rounding)
+                via_link = np.add.outer(weight[:, v1] + prev_w, weight[v2, :])
+                affected_rows |= (np.isfinite(via_link) & (via_link <= weight * (1 + 1e-9))).any(axis=1)
+        affected = np.flatnonzero(affected_rows).tolist()
+        adjacency = adjacency_lists(index, links)
+        for i in affected:
+            weight[i], delay[i], pred[i] = dijkstra(adjacency, i)
+        # the intermediate nodes are kept unchanged for the paths of unaffected rows; affected rows now follow pred
+        updated = ShortestPaths(shortest_paths.node_ids, weight, delay, pred, shortest_paths.via,
+                                shortest_paths.superseded, shortest_paths.pred_rows | affected_rows)
+        updated.earlier_vias = shortest_paths.earlier_vias
+
+    # keep reconstructed paths of unaffected rows
+    affected = {shortest_paths.node_ids[i] for i in affected}
+    updated.paths = {key: path for key, path in shortest_paths.paths.items() if key[0] not in affected}
+    logger.info("Repaired shortest paths after {} link changes: {} of {} rows affected"
+                .format(len(changed_links), len(affected), len(index)))
+    return updated
+
+
+# floyd-warshall algorithm; return weight, delay, predecessor, and intermediate node matrices (indices as in nodes.ids)
+def floyd_warshall(nodes, links):
+    n = len(nodes.ids)
+    index = {v: idx for idx, v in enumerate(nodes.ids)}
+
+    # initialize shortest paths: weight 0 to the node itself, link weight via direct links, infinite weight otherwise
+    # paths without links have infinite delay (like path_delay); direct links keep their delay even with infinite weight
+    weight = [[math.inf] * n for _ in range(n)]
+    delay = [[math.inf] * n for _ in range(n)]
+    pred = [[v1] * n for v1 in range(n)]
+    via = [[-1] * n for _ in range(n)]
+    superseded = []
+    for (v1, v2) in links.ids:
+        if v1 in index and v2 in index and v1 != v2:
+            weight[index[v1]][index[v2]] = links.weight((v1, v2))
+            delay[index[v1]][index[v2]] = links.delay[(v1, v2)]
+    for v in range(n):
+        weight[v][v] = 0
+        delay[v][v] = 0
 
     # indirect paths via intermediate node k
-    for k in nodes.ids:
-        for v1 in nodes.ids:
-            for v2 in nodes.ids:
+    for k in range(n):
+        for v1 in range(n):
+            for v2 in range(n):
                 # use k if it reduces the path weight
-                if shortest_paths[(v1, v2)][1] > shortest_paths[(v1, k)][1] + shortest_paths[(k, v2)][1]:
-                    # new path via intermediate node k (when adding the two paths, k is excluded from the second path)
-                    new_path = shortest_paths[(v1, k)][0] + shortest_paths[(k, v2)][0][1:]
-                    new_weight = shortest_paths[(v1, k)][1] + shortest_paths[(k, v2)][1]
-                    shortest_paths[(v1, v2)] = (new_path, new_weight)
+                if weight[v1][v2] > weight[v1][k] + weight[k][v2]:
+                    weight[v1][v2] = weight[v1][k] + weight[k][v2]
+                    delay[v1][v2] = delay[v1][k] + delay[k][v2]
+                    pred[v1][v2] = pred[k][v2]
+                    if via[v1][v2] >= 0:
+                        superseded.append((v1, v2, via[v1][v2]))
+                    via[v1][v2] = k
 
-    # update dictionary to include delay for each path
-    shortest_paths = {k:(v[0], v[1], path_delay(links, v[0])) for k,v in shortest_paths.items()}
+    return weight, delay, pred, via, np.array(superseded, dtype=np.int32).reshape(-1, 3)
 
-    return shortest_paths
+
+# same as floyd_warshall but vectorized with numpy: update all pairs at once per intermediate node k
+def floyd_warshall_numpy(nodes, links):
+    n = len(nodes.ids)
+    index = {v: idx for idx, v in enumerate(nodes.ids)}
+
+    # same initialization as floyd_warshall (based on the links in CSR form)
+    adjacency = links.adjacency(index)
+    weight = np.full((n, n), math.inf)
+    delay = np.full((n, n), math.inf)
+    weight[adjacency.source, adjacency.dest] = adjacency.weight
+    delay[adjacency.source, adjacency.dest] = adjacency.delay
+    np.fill_diagonal(weight, 0)
+    np.fill_diagonal(delay, 0)
+    pred = np.repeat(np.arange(n, dtype=np.int32)[:, np.newaxis], n, axis=1)
+    via = np.full((n, n), -1, dtype=np.int32)
+    superseded = [np.zeros((0, 3), dtype=np.int32)]
+
+    # indirect paths via intermediate node k: use k for all pairs where it strictly reduces the path weight
+    # buffers are reused across iterations to avoid allocating new n x n matrices for each k
+    new_weight = np.empty((n, n))
+    new_delay = np.empty((n, n))
+    improved = np.empty((n, n), dtype=bool)
+    for k in range(n):
+        np.add.outer(weight[:, k], weight[k, :], out=new_weight)
+        np.greater(weight, new_weight, out=improved)
+        if not improved.any():
+            continue
+        np.add.outer(delay[:, k], delay[k, :], out=new_delay)
+        np.copyto(weight, new_weight, where=improved)
+        np.copyto(delay, new_delay, where=improved)
+        np.copyto(pred, pred[k, :].copy(), where=improved)
+        rows, cols = np.nonzero(improved & (via >= 0))
+        superseded.append(np.column_stack([rows, cols, via[rows, cols]]).astype(np.int32))
+        np.copyto(via, k, where=improved)
+
+    return weight, delay, pred, via, np.concatenate(superseded)
+
+
+# return outgoing links of each node (by index) with their weight and delay
+# plain lists of tuples (from the links in CSR form) as dijkstra accesses them one by one
+def adjacency_lists(index, links):
+    adjacency = links.adjacency(index)
+    return [list(zip(*(a.tolist() for a in adjacency.out_links(k)))) for k in range(len(index))]
+
+
+# single-source dijkstra from node index src on the adjacency lists of LazyShortestPaths
+# return weights, delays, and predecessors (lists indexed like the nodes) with the same conventions as floyd_warshall
+def dijkstra(adjacency, src):
+    n = len(adjacency)
+    weight, delay, pred = [math.inf] * n, [math.inf] * n, [src] * n
+    weight[src], delay[src] = 0, 0
+    visited = [False] * n
+    heap = [(0, src)]
+    while heap:
+        w, v1 = heapq.heappop(heap)
+        if visited[v1]:
+            continue
+        visited[v1] = True
+        for v2, link_weight, link_delay in adjacency[v1]:
+            # links with infinite weight (no capacity) are never used
+            if w + link_weight < weight[v2]:
+                weight[v2] = w + link_weight
+                delay[v2] = delay[v1] + link_delay
+                pred[v2] = v1
+                heapq.heappush(heap, (weight[v2], v2))
+
+    # unreachable nodes connected by a direct link (without capacity) keep the link's delay
+    for v2, link_weight, link_delay in adjacency[src]:
+        if weight[v2] == math.inf:
+            delay[v2] = link_delay
+    return weight, delay, pred
+
+
+def row_arrays(weight, delay, pred):
+    return np.array(weight, dtype=np.float64), np.array(delay, dtype=np.float64), np.array(pred, dtype=np.int32)
+
+
+# adjacency lists are only sent once to each worker process of LazyShortestPaths.prefetch
+worker_adjacency = None
+
+
+def init_dijkstra_worker(adjacency):
+    global worker_adjacency
+    worker_adjacency = adjacency
+
+
+def dijkstra_worker(src):
+    return dijkstra(worker_adjacency, src)
@@ -0,0 +1,32 @@
+import threading
+
+
+# registry assigning consecutive integer ids to names (of nodes, components, or templates); equal names get the same id
+# such that comparing and hashing ids is equivalent to comparing and hashing the names, but cheaper
+# ids depend on the order of interning and are only valid within a process => they are interned again when unpickling
+class Registry:
+    def __init__(self):
+        self.ids = {}		# name: id
+        self.names = []		# id: name
+        self.lock = threading.Lock()
+
+    # return the id of the specified name (a new id if the name wasn't interned before)
+    def id(self, name):
+        name_id = self.ids.get(name)
+        if name_id is None:
+            with self.lock:		# concurrent placements in different threads may intern the same name
+                name_id = self.ids.get(name)
+                if name_id is None:
+                    name_id = len(self.names)
+                    self.names.append(name)
+                    self.ids[name] = name_id
+        return name_id
+
+    # return the name with the specified id
+    def name(self, name_id):
+        return self.names[name_id]
+
+
+nodes = Registry()
+components = Registry()
+templates = Registry()
@@ -4,13 +4,16 @@ import argparse
 import logging
 import os
 import random
+import time
 
 import bjointsp.objective as objective
 import bjointsp.read_write.reader as reader
 import bjointsp.read_write.writer as writer
 
 from datetime import datetime
+from bjointsp.fixed import bundling
 from bjointsp.heuristic import control
+from bjointsp.heuristic import shortest_paths as sp
 
 logger = logging.getLogger('bjointsp')
 
@@ -27,14 +30,102 @@ obj = objective.COMBINED
 # in that case, optionally specify a networkx_cap attribute string to retrieve the current node and link capacity
 # print_best = whether or not to print the best overlay found at the end
 # logging level can be configured or completely disabled by setting to None
+# sp_engine selects the engine for pre-computing all-pairs shortest paths (see shortest_paths.ENGINES)
+# optionally, sp_cache is a directory, where shortest paths are cached and reused for the same network across calls
+# with the lazy dijkstra engine, sp_processes sets the number of processes for computing paths from the sources upfront
+# optionally, sp_dynamic is a shortest_paths.DynamicShortestPaths object that is kept by the caller across calls on the
+# same topology (eg, each simulator step): only paths affected by changed link capacities or delays are recomputed
+# for multi-start, set starts to the number of parallel improvement trajectories or start_seeds to a list of their seeds
+# (for reproducible runs); start_processes limits the number of processes; each seed and score is added to the result
+# optionally, stop the improvement after time_budget seconds and return the best placement found so far
+# for many flows per source, set flow_bundles to aggregate each source's flows into at most this many bundles, which are
+# placed like single flows (faster, but coarser); the result lists the original flows
+# on very large networks, set candidate_limit to only consider the candidate_limit nodes with the lowest path weight
+# from the previous instance when placing an instance; the search widens if none of them has enough resources
+# (approximation: if no node has enough resources, the least over-subscribed of these nodes is chosen, not of all nodes)
 def place(network_file, template_file, source_file, source_template_object=False, fixed_vnfs=None,
           prev_embedding_file=None, cpu=None, mem=None, dr=None, networkx=None, networkx_cap='cap', write_result=True,
-          print_best=True, logging_level=logging.INFO):
-    seed = random.randint(0, 9999)
+          print_best=True, logging_level=logging.INFO, sp_engine=sp.NUMPY, sp_cache=None,
+          sp_processes=None, sp_dynamic=None, starts=None, start_seeds=None, start_processes=None, time_budget=None,
+          flow_bundles=None, candidate_limit=None):
+    seed, timestamp = init_run(network_file, logging_level)
+    seed_subfolder = False
+    nodes, links, templates, sources, fixed, prev_embedding = read_inputs(network_file, template_file, source_file,
+                                                                          source_template_object, fixed_vnfs,
+                                                                          prev_embedding_file, cpu, mem, dr, networkx,
+                                                                          networkx_cap, sp_engine, sp_cache,
+                                                                          sp_dynamic)
+    input_files = [network_file, template_file, source_file, fixed_vnfs, prev_embedding_file]
+    bundles = None
+    if flow_bundles is not None:
+        sources, bundles = bundling.bundle_flows(sources, flow_bundles)
+    # TODO: support >1 template
+
+    # print("Using seed {}".format(seed))
+
+    logger.info("Starting initial embedding at {}".format(timestamp))
+    # print("Initial embedding\n")
+    init_time, runtime, obj_value, changed, overlays, start_results = \
+        control.solve(nodes, links, templates, prev_embedding, sources, fixed, obj, print_best=print_best,
+                      sp_engine=sp_engine, sp_cache=sp_cache, sp_processes=sp_processes, sp_dynamic=sp_dynamic,
+                      starts=starts, start_seeds=start_seeds, start_processes=start_processes,
+                      time_budget=time_budget, seed=seed, candidate_limit=candidate_limit)
+    if overlays is None:
+        logger.error("Could not find placement. Returning None.")
+        return None
+    # If the write_result variable is True we receive the path to a result file
+    # If the write_result variable is False we a result dict.
+    result = writer.write_heuristic_result(runtime, obj_value, changed, overlays.values(), input_files, obj, nodes,
+                                           links, seed, seed_subfolder, write_result, source_template_object,
+                                           start_results, bundles)
+
+    return result
+
+
+# anytime version of place: yield each new best placement as soon as it is found, starting with the initial placement
+# each placement is yielded as (objective value, elapsed time in seconds, result dict as returned by place)
+# callers can stop iterating at any time (eg, when their latency budget is exhausted) and use the last placement
+# the arguments are the same as for place; results are not written to files
+def place_iter(network_file, template_file, source_file, source_template_object=False, fixed_vnfs=None,
+               prev_embedding_file=None, cpu=None, mem=None, dr=None, networkx=None, networkx_cap='cap',
+               logging_level=logging.INFO, sp_engine=sp.NUMPY, sp_cache=None, sp_processes=None, sp_dynamic=None,
+               starts=None, start_seeds=None, start_processes=None, time_budget=None, flow_bundles=None,
+               candidate_limit=None):
+    start = time.time()
+    seed, timestamp = init_run(network_file, logging_level)
     seed_subfolder = False
+    nodes, links, templates, sources, fixed, prev_embedding = read_inputs(network_file, template_file, source_file,
+                                                                          source_template_object, fixed_vnfs,
+                                                                          prev_embedding_file, cpu, mem, dr, networkx,
+                                                                          networkx_cap, sp_engine, sp_cache,
+                                                                          sp_dynamic)
+    input_files = [network_file, template_file, source_file, fixed_vnfs, prev_embedding_file]
+    bundles = None
+    if flow_bundles is not None:
+        sources, bundles = bundling.bundle_flows(sources, flow_bundles)
+    # read the input details for the results once, not again for each yielded placement
+    inputs = writer.input_details(input_files, obj, seed, source_template_object)
+
+    logger.info("Starting initial embedding at {}".format(timestamp))
+    solutions = control.solve_iter(nodes, links, templates, prev_embedding, sources, fixed, obj, print_best=False,
+                                   sp_engine=sp_engine, sp_cache=sp_cache, sp_processes=sp_processes,
+                                   sp_dynamic=sp_dynamic, starts=starts, start_seeds=start_seeds,
+                                   start_processes=start_processes, time_budget=time_budget, seed=seed,
+                                   candidate_limit=candidate_limit)
+    for overlays, obj_value, changed in solutions:
+        elapsed = time.time() - start
+        result = writer.write_heuristic_result(elapsed, obj_value, changed, overlays.values(), input_files, obj, nodes,
+                                               links, seed, seed_subfolder, False, source_template_object,
+                                               bundles=bundles, inputs=inputs)
+        yield obj_value, elapsed, result
+
+
+# pick and set a random seed and set up logging into file logs/heuristic/obj/network_timestamp_seed.log
+# return the seed and the timestamp
+def init_run(network_file, logging_level):
+    seed = random.randint(0, 9999)
     random.seed(seed)
 
-    # set up logging into file Data/logs/heuristic/scenario_timestamp_seed.log
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     if logging_level is None:
         logging.disable(logging.CRITICAL)
@@ -43,7 +134,12 @@ def place(network_file, template_file, source_file, source_template_object=False
         logging.basicConfig(filename="logs/heuristic/obj{}/{}_{}_{}.log"
                             .format(obj, os.path.basename(network_file)[:-4], timestamp, seed),
                             level=logging_level, format="%(asctime)s(%(levelname)s):\t%(message)s", datefmt="%H:%M:%S")
+    return seed, timestamp
 
+
+# read network, template, sources, fixed instances, and previous embedding
+def read_inputs(network_file, template_file, source_file, source_template_object, fixed_vnfs, prev_embedding_file,
+                cpu, mem, dr, networkx, networkx_cap, sp_engine, sp_cache, sp_dynamic):
     # if a NetworkX object is passed, use that - including all of its capacities, delays, etc
     if networkx is not None:
         nodes, links = reader.read_networkx(networkx, cap=networkx_cap)
@@ -66,26 +162,9 @@ def place(network_file, template_file, source_file, source_template_object=False
     if networkx is not None:
         prev_embedding = reader.read_prev_placement(networkx, templates)
     elif prev_embedding_file is not None:
-        prev_embedding = reader.read_prev_embedding(prev_embedding_file, templates, nodes, links)
-
-    input_files = [network_file, template_file, source_file, fixed_vnfs, prev_embedding_file]
-    # TODO: support >1 template
-
-    # print("Using seed {}".format(seed))
-
-    logger.info("Starting initial embedding at {}".format(timestamp))
-    # print("Initial embedding\n")
-    init_time, runtime, obj_value, changed, overlays = control.solve(nodes, links, templates, prev_embedding, sources,
-                                                                     fixed, obj, print_best=print_best)
-    if overlays is None:
-        logger.error("Could not find placement. Returning None.")
-        return None
-    # If the write_result variable is True we receive the path to a result file
-    # If the write_result variable is False we a result dict.
-    result = writer.write_heuristic_result(runtime, obj_value, changed, overlays.values(), input_files, obj, nodes,
-                                           links, seed, seed_subfolder, write_result, source_template_object)
-
-    return result
+        prev_embedding = reader.read_prev_embedding(prev_embedding_file, templates, nodes, links,
+                                                    sp_engine=sp_engine, sp_cache=sp_cache, sp_dynamic=sp_dynamic)
+    return nodes, links, templates, sources, fixed, prev_embedding
 
 
 def parse_args():
@@ -0,0 +1,38 @@
+from collections.abc import Mapping
+import numpy as np
+
+
+# values of nodes or links stored in an array (positions = dense integer indices of the nodes or links)
+# can still be accessed by node or link ID like the dicts used before (ID: value), e.g., nodes.cpu["pop1"]
+class IndexedArray(Mapping):
+    def __init__(self, index, values):
+        self.index = index					# ID: index (shared by all arrays of the same nodes or links)
+        self.array = np.array(values)		# values in the order of the indices
+
+    # return the value of the node or link with the specified ID as plain python number
+    def __getitem__(self, key):
+        return self.array.item(self.index[key])
+
+    def __setitem__(self, key, value):
+        self.array[self.index[key]] = value
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __str__(self):
+        return str(dict(self.items()))
+
+
+# return the values in the order of the IDs; values are either a sequence in this order or a dict (ID: value)
+def ordered_values(ids, values):
+    if isinstance(values, Mapping):
+        return [values[i] for i in ids]
+    if len(values) != len(ids):
+        raise ValueError("{} values for {} IDs".format(len(values), len(ids)))
+    return values
@@ -1,11 +1,24 @@
 import math
+import numpy as np
+from bjointsp.network.indexed import IndexedArray, ordered_values
 
 
+# directed links (pairs of node IDs) with dense integer indices (their positions in ids); dr and delay are arrays in
+# this order, which can still be accessed by link ID (e.g., links.dr[("pop1", "pop2")])
+# dr and delay are passed either as dicts (link ID: value) or as sequences in the order of ids
 class Links:
     def __init__(self, ids, dr, delay):
         self.ids = ids
-        self.dr = dr
-        self.delay = delay
+        self.index = {l: k for k, l in enumerate(ids)}		# link ID: index
+        self.dr = IndexedArray(self.index, ordered_values(ids, dr))
+        self.delay = IndexedArray(self.index, ordered_values(ids, delay))
+
+    # return links in both directions: the specified links followed by the reversed links with the same dr and delay
+    @classmethod
+    def bidirectional(cls, ids, dr, delay):
+        reversed_ids = [(v2, v1) for (v1, v2) in ids]
+        dr, delay = ordered_values(ids, dr), ordered_values(ids, delay)
+        return cls(ids + reversed_ids, np.concatenate([dr, dr]), np.concatenate([delay, delay]))
 
     # link weight = 1 / (cap + 1/delay) => prefer high cap, use smaller delay as additional influence/tie breaker
     def weight(self, link):
@@ -14,3 +27,92 @@ class Links:
         elif self.delay[link] == 0:
             return 0
         return 1 / (self.dr[link] + 1 / self.delay[link])
+
+    # return the weights of all links (in the order of ids); same as weight(link) for each link
+    def weights(self):
+        dr = self.dr.array.astype(np.float64)
+        delay = self.delay.array.astype(np.float64)
+        with np.errstate(divide="ignore"):
+            weights = 1 / (dr + 1 / delay)
+        weights[delay == 0] = 0
+        weights[dr == 0] = math.inf
+        return weights
+
+    # return the outgoing links of all nodes in compressed sparse row (CSR) form for the specified node index
+    def adjacency(self, node_index):
+        return Adjacency(self, node_index)
+
+
+# outgoing links of each node in compressed sparse row (CSR) form: the links leaving the node with index k are at the
+# positions indptr[k] to indptr[k + 1] of the other arrays (in the order of links.ids)
+# self-loops and links from or to nodes without an index are skipped; duplicate link IDs refer to the same link index
+class Adjacency:
+    def __init__(self, links, node_index):
+        link, source, dest = [], [], []
+        for (v1, v2) in links.ids:
+            if v1 in node_index and v2 in node_index and v1 != v2:
+                link.append(links.index[(v1, v2)])
+                source.append(node_index[v1])
+                dest.append(node_index[v2])
+
+        # group the links by source node (stable => same order as in links.ids)
+        source = np.array(source, dtype=np.intp)
+        order = np.argsort(source, kind="stable")
+        self.source = source[order]
+        self.dest = np.array(dest, dtype=np.intp)[order]
+        self.link = np.array(link, dtype=np.intp)[order]		# link index
+        self.indptr = np.zeros(len(node_index) + 1, dtype=np.intp)
+        np.cumsum(np.bincount(self.source, minlength=len(node_index)), out=self.indptr[1:])
+        self.weight = links.weights()[self.link]
+        self.delay = links.delay.array[self.link]
+
+    # return the indices of the dest nodes, the weights, and the delays of the links leaving the node with index k
+    def out_links(self, k):
+        start, end = self.indptr[k], self.indptr[k + 1]
+        return self.dest[start:end], self.weight[start:end], self.delay[start:end]
+
+
+# sparse link-path incidence: the indices of the links traversed by each path (built once per path)
+# link indices refer to links.index, where duplicate link IDs (parallel links) share the index of their last position
+# loads and capacities are arrays with one entry per position in links.ids (incl. duplicates): like looping over
+# links.ids, each position of a duplicate link ID gets the load and capacity of that link ID (links.dr[l])
+class LinkIncidence:
+    def __init__(self, links):
+        self.index = links.index
+        self.positions = np.array([links.index[l] for l in links.ids], dtype=np.intp)	# position: link index
+        self.dr = links.dr.array[self.positions]
+        self.delay = links.delay.array			# by link index
+        self.paths = {}			# path: indices of traversed links
+
+    def __len__(self):
+        return len(self.positions)
+
+    # return the indices of all links along the path
+    # skip connections on the same node (no link used) and pairs of nodes without a link (path is infeasible anyway)
+    def path_links(self, path):
+        if path not in self.paths:
+            self.paths[path] = np.array([self.index[(path[k], path[k + 1])] for k in range(len(path) - 1)
+                                         if path[k] != path[k + 1] and (path[k], path[k + 1]) in self.index],
+                                        dtype=np.intp)
+        return self.paths[path]
+
+    # return the indices of all links used by the edge (each link only once, even if used by multiple paths)
+    def edge_links(self, edge):
+        if len(edge.paths) == 1:
+            return self.path_links(edge.paths[0])
+        return np.unique(np.concatenate([self.path_links(path) for path in edge.paths]))
+
+    # return the data rate at each position in links.ids used by the edges; the edge dr is split equally among all paths
+    # corresponds to multiplying the link-path incidence matrix with the vector of path data rates
+    def load(self, edges):
+        path_links, path_dr = [], []
+        for e in edges:
+            dr = e.flow_dr() / len(e.paths) if e.paths else 0
+            for path in e.paths:
+                path_links.append(self.path_links(path))
+                path_dr.append(dr)
+        if not path_links:
+            return np.zeros(len(self))
+        lengths = [len(l) for l in path_links]
+        load = np.bincount(np.concatenate(path_links), weights=np.repeat(path_dr, lengths), minlength=len(self))
+        return load[self.positions]
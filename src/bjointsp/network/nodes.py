@@ -1,5 +1,12 @@
+from bjointsp.network.indexed import IndexedArray, ordered_values
+
+
+# nodes with dense integer indices (their positions in ids); cpu and mem are arrays in this order, which can still be
+# accessed by node ID (e.g., nodes.cpu["pop1"])
+# cpu and mem are passed either as dicts (node ID: capacity) or as sequences in the order of ids
 class Nodes:
     def __init__(self, ids, cpu, mem):
         self.ids = ids
-        self.cpu = cpu
-        self.mem = mem
+        self.index = {v: k for k, v in enumerate(ids)}		# node ID: index
+        self.cpu = IndexedArray(self.index, ordered_values(ids, cpu))
+        self.mem = IndexedArray(self.index, ordered_values(ids, mem))
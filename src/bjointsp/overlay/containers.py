@@ -0,0 +1,102 @@
+from collections import Counter
+
+
+# instances of an overlay in insertion order (like a list), indexed by component and location for fast lookups
+# there is at most one instance per component and location (instances are compared by component and location)
+class InstanceCollection:
+    def __init__(self, instances=()):
+        self.by_key = {}				# (component, location): instance
+        self.by_component = {}			# component: {location: instance} (in the same order)
+        self.num_fixed = Counter()		# component: number of fixed instances
+        for i in instances:
+            self.append(i)
+
+    def __iter__(self):
+        return iter(self.by_key.values())
+
+    def __reversed__(self):
+        return reversed(self.by_key.values())
+
+    def __len__(self):
+        return len(self.by_key)
+
+    def __contains__(self, instance):
+        return (instance.component, instance.location) in self.by_key
+
+    def __str__(self):
+        return str(list(self.by_key.values()))
+
+    # return a copy with the same instances (eg, for the undo journal)
+    def copy(self):
+        new_collection = InstanceCollection()
+        new_collection.by_key = self.by_key.copy()
+        new_collection.by_component = {j: instances.copy() for j, instances in self.by_component.items()}
+        new_collection.num_fixed = self.num_fixed.copy()
+        return new_collection
+
+    def append(self, instance):
+        key = (instance.component, instance.location)
+        if key in self.by_key:
+            raise ValueError("Overlay already has an instance {}".format(instance))
+        self.by_key[key] = instance
+        self.by_component.setdefault(instance.component, {})[instance.location] = instance
+        if instance.fixed:
+            self.num_fixed[instance.component] += 1
+
+    def remove(self, instance):
+        key = (instance.component, instance.location)
+        if key not in self.by_key:
+            raise ValueError("Overlay has no instance {}".format(instance))
+        instance = self.by_key.pop(key)
+        del self.by_component[instance.component][instance.location]
+        if instance.fixed:
+            self.num_fixed[instance.component] -= 1
+
+    # return the instance of the component at the location (None if there is none)
+    def get(self, component, location):
+        return self.by_key.get((component, location))
+
+    # return all instances of the component (in insertion order)
+    def of_component(self, component):
+        return list(self.by_component.get(component, {}).values())
+
+    # return whether the component has fixed instances
+    def has_fixed(self, component):
+        return self.num_fixed[component] > 0
+
+
+# edges of an overlay in insertion order (like a list) with fast membership tests
+# there is at most one edge per source and dest instance (edges are compared by source and dest)
+class EdgeCollection:
+    def __init__(self, edges=()):
+        self.edges = {}		# edge: edge (dict as insertion-ordered set)
+        for e in edges:
+            self.append(e)
+
+    def __iter__(self):
+        return iter(self.edges)
+
+    def __len__(self):
+        return len(self.edges)
+
+    def __contains__(self, edge):
+        return edge in self.edges
+
+    def __str__(self):
+        return str(list(self.edges))
+
+    # return a copy with the same edges (eg, for the undo journal)
+    def copy(self):
+        new_collection = EdgeCollection()
+        new_collection.edges = self.edges.copy()
+        return new_collection
+
+    def append(self, edge):
+        if edge in self.edges:
+            raise ValueError("Overlay already has an edge {}".format(edge))
+        self.edges[edge] = edge
+
+    def remove(self, edge):
+        if edge not in self.edges:
+            raise ValueError("Overlay has no edge {}".format(edge))
+        del self.edges[edge]
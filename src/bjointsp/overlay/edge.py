@@ -1,16 +1,36 @@
+from bjointsp.overlay import journal
+
+
 class Edge:
+    __slots__ = ("arc", "source", "dest", "_hash", "direction", "paths", "flows", "_flow_dr")
+
     def __init__(self, arc, source, dest):
         self.arc = arc
         self.source = source
         self.dest = dest
+        self._hash = hash((source, dest))
         self.direction = arc.direction
         # initialize without path (adjusted later); FUTURE WORK: multiple paths per edge
-        self.paths = []		# list of paths(=list of nodes); initially path-dr equally split among all paths
+        self.paths = []		# list of paths(=tuple of nodes); initially path-dr equally split among all paths
         self.flows = []		# list of flows passing the edge
+        self._flow_dr = 0		# cached total dr of all flows (None if outdated)
+        journal.created(self)
 
         # automatically add edge to source and dest instance
+        journal.save(self.source)
+        journal.save(self.dest)
         self.source.edges_out[dest] = self
         self.dest.edges_in[source] = self
+        self.dest.invalidate()
+
+    # the hash is only valid within the process and computed again when unpickling
+    def __getstate__(self):
+        return {key: getattr(self, key) for key in self.__slots__ if key != "_hash"}
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
+        self._hash = hash((self.source, self.dest))
 
     def __str__(self):
         if self.direction == "forward":
@@ -36,13 +56,22 @@ class Edge:
         return NotImplemented
 
     def __hash__(self):
-        return hash((self.source, self.dest))
+        return self._hash
 
     def print(self):
         print("Edge from {} to {} ({}) with flows {}".format(self.source, self.dest, self.direction, self.flows))
         for path in self.paths:
             print("\tNodes on path: ", *path, sep=" ")
 
-    # total data rate along the edge of all current flows
+    # total data rate along the edge of all current flows (cached until flows are (un)mapped or their dr changes)
     def flow_dr(self):
-        return sum(f.dr[self] for f in self.flows)
+        if self._flow_dr is None:
+            self._flow_dr = sum(f.dr[self] for f in self.flows)
+        return self._flow_dr
+
+    # discard the cached data rate (and the ingoing dr of the dest instance) after flows were (un)mapped to the edge or
+    # their dr along the edge changed
+    def invalidate(self):
+        journal.save(self)
+        self._flow_dr = None
+        self.dest.invalidate()
@@ -1,10 +1,30 @@
+from bjointsp.overlay import journal
+
+
 # unsplittable flow with a unique ID and an initial data rate (when leaving the source)
 class Flow:
+    __slots__ = ("id", "_hash", "src_dr", "dr", "passed_stateful")
+
     def __init__(self, flow_id, src_dr):
         self.id = flow_id
+        self._hash = hash(flow_id)
         self.src_dr = src_dr
         self.dr = {}					# the flow's dr along a specific edge (edge: dr)
         self.passed_stateful = {}		# stateful instances passed by the flow (component: instance)
+        journal.created(self)
+
+    # pickle the plain flow (eg, when passing sources to worker processes); its mapping to edges is part of the overlay
+    # the hash is only valid within the process and computed again when unpickling
+    def __getstate__(self):
+        state = {key: getattr(self, key) for key in self.__slots__ if key != "_hash"}
+        state["dr"] = {}
+        state["passed_stateful"] = {}
+        return state
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
+        self._hash = hash(self.id)
 
     def __str__(self):
         return self.id
@@ -24,7 +44,7 @@ class Flow:
         return NotImplemented
 
     def __hash__(self):
-        return hash((self.id))
+        return self._hash
 
     def full_str(self):
         return "({}, {})".format(self.id, self.src_dr)
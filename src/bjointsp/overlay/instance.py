@@ -1,21 +1,45 @@
 import math
 from collections import defaultdict
+from bjointsp import interning
+from bjointsp.overlay import journal
 
 
 class Instance:
+    __slots__ = ("component", "location", "key", "_hash", "src_flows", "fixed", "edges_in", "edges_out", "_input_dr")
+
     def __init__(self, component, location, src_flows=None, fixed=False):
         if (component.source and src_flows is None) or (not component.source and src_flows is not None):
             raise ValueError("src_flows has to be set for source components and source components only")
         self.component = component
         self.location = location
+        self.key = (component.id, interning.nodes.id(location))		# ids of component and location (compared)
+        self._hash = hash(self.key)
         self.src_flows = src_flows
         if src_flows is not None:
             for f in src_flows:
+                journal.save(f)
                 f.passed_stateful[component] = self
         self.fixed = fixed
         # edges can be accessed in the dictionary with the other instance as key
         self.edges_in = {}
         self.edges_out = {}
+        self._input_dr = None		# cached ingoing dr per input (None if outdated)
+        journal.created(self)
+
+    # pickle the plain instance (eg, when passing previous instances to worker processes); edges are part of the overlay
+    # the key and hash are only valid within the process and computed again when unpickling
+    def __getstate__(self):
+        state = {key: getattr(self, key) for key in self.__slots__ if key not in ("key", "_hash")}
+        state["edges_in"] = {}
+        state["edges_out"] = {}
+        state["_input_dr"] = None
+        return state
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
+        self.key = (self.component.id, interning.nodes.id(self.location))
+        self._hash = hash(self.key)
 
     def __str__(self):
         if self.src_flows is not None:
@@ -27,10 +51,10 @@ class Instance:
             return "({},{}):{}".format(self.component, self.location, self.src_flows)
         return "({},{})".format(self.component, self.location)
 
-    # instance defined by component and location (only one per comp and loc)
+    # instance defined by component and location (only one per comp and loc) <=> by their ids
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.component == other.component and self.location == other.location
+            return self.key == other.key
         return NotImplemented
 
     def __ne__(self, other):
@@ -39,7 +63,7 @@ class Instance:
         return NotImplemented
 
     def __hash__(self):
-        return hash((self.component, self.location))
+        return self._hash
 
     # return cpu consumption based on all ingoing edges
     # ignore the idle consumption if instances of component specified in ignore_idle
@@ -52,7 +76,10 @@ class Instance:
         return self.component.mem_req(self.input_dr(), ignore_idle)
 
     # return the ingoing data rate of each input as vector/list based on all ingoing edges (and the flows mapped to them)
+    # the vector is cached until ingoing edges are added or removed or their dr changes (must not be modified)
     def input_dr(self):
+        if self._input_dr is not None:
+            return self._input_dr
         in_dr = []
         for k in range(self.component.inputs):
             # get all ingoing edges at input k and append their summed up data rate
@@ -62,14 +89,21 @@ class Instance:
             # get all ingoing edges at input k and append their summed up data rate
             in_edges = [e for e in self.edges_in.values() if e.direction == "backward" and e.arc.dest_in == k]
             in_dr.append(sum(e.flow_dr() for e in in_edges))
+        self._input_dr = in_dr
         return in_dr
 
+    # discard the cached ingoing data rates after ingoing edges were added or removed or their dr changed
+    def invalidate(self):
+        journal.save(self)
+        self._input_dr = None
+
     # if this instance is stateful and traversed in fwd dir, update passed_stateful of all ingoing flows
     # in bwd dir the same instance is traversed and passed_stateful doesn't need any update
     def update_passed_stateful(self, direction):
         if self.component.stateful and direction == "forward":
             flows = [f for e in self.edges_in.values() if e.direction == direction for f in e.flows]
             for f in flows:
+                journal.save(f)
                 f.passed_stateful[self.component] = self
 
     # return dict with the flows and their dr that should leave each output of the instance in the specified direction
@@ -0,0 +1,87 @@
+# undo journal for overlays: before an overlay, instance, edge, flow, or ledger is modified for the first time after a
+# checkpoint, its state is recorded; rolling back to a checkpoint restores these states in reverse order
+# this allows keeping multiple solutions (e.g., incumbent and best) as checkpoints of a single set of overlays, which is
+# modified in place, rather than as deep copies; a rollback takes time proportional to the size of the modification
+import threading
+
+
+# journal that records all modifications in the current thread (none by default); concurrent placements in different
+# threads record their modifications in their own journals
+recording = threading.local()
+
+
+# return the state of an object before its modification: copies of its attributes that are modified in place
+# (lists, dicts, sets); objects with nested containers provide their own journal_state
+def snapshot(obj):
+    if hasattr(obj, "journal_state"):
+        return obj.journal_state()
+    if hasattr(obj, "__slots__"):
+        attributes = {key: getattr(obj, key) for key in obj.__slots__}
+    else:
+        attributes = vars(obj)
+    return {key: value.copy() if isinstance(value, (list, dict, set)) else value for key, value in attributes.items()}
+
+
+class Journal:
+    def __init__(self):
+        self.entries = []		# (object, state before its first modification after a checkpoint)
+        self.start = 0			# position of the first entry (earlier entries are discarded)
+        self.touched = {}		# id: object saved or created since the last checkpoint (with reference to keep id unique)
+
+    # return the current position in the journal
+    def position(self):
+        return self.start + len(self.entries)
+
+    # record that the object was created (no need to save it, it's unreachable in the state of the last checkpoint)
+    def created(self, obj):
+        self.touched[id(obj)] = obj
+
+    # save the state of the object before it is modified (only once after each checkpoint)
+    def save(self, obj):
+        if id(obj) not in self.touched:
+            self.touched[id(obj)] = obj
+            self.entries.append((obj, snapshot(obj)))
+
+    # set a checkpoint and return its position, which can be rolled back to later
+    def checkpoint(self):
+        self.touched = {}
+        return self.position()
+
+    # restore the state at the checkpoint at the specified position; later modifications are saved anew
+    def rollback(self, position):
+        if position < self.start:
+            raise ValueError("Cannot roll back to position {} before discarded entries".format(position))
+        for obj, state in reversed(self.entries[position - self.start:]):
+            for key, value in state.items():
+                setattr(obj, key, value)
+        del self.entries[position - self.start:]
+        self.touched = {}
+
+    # discard the entries before the specified position (no rollback to earlier checkpoints afterwards)
+    def discard(self, position):
+        del self.entries[:position - self.start]
+        self.start = position
+
+
+# record all following modifications in the current thread in the specified journal (None to stop recording)
+def activate(journal):
+    recording.journal = journal
+
+
+# return the journal recording modifications in the current thread (None if modifications are not recorded)
+def active():
+    return getattr(recording, "journal", None)
+
+
+# save the state of the object in the active journal (if any) before modifying it
+def save(obj):
+    journal = getattr(recording, "journal", None)
+    if journal is not None:
+        journal.save(obj)
+
+
+# record a new object in the active journal (if any)
+def created(obj):
+    journal = getattr(recording, "journal", None)
+    if journal is not None:
+        journal.created(obj)
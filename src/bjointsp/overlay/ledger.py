@@ -0,0 +1,137 @@
+import itertools
+from collections import Counter, defaultdict
+from bjointsp.overlay import journal
+
+
+# every change of a ledger gets a new, unique state; copies of a ledger share its state until one of them changes
+states = itertools.count()
+
+
+# resources consumed by the instances and edges of an overlay, updated incrementally whenever instances or edges are
+# added or removed or flows are (un)mapped; avoids recomputing the consumption of all instances and edges per request
+# the totals of a node or link are summed again from its instances or edges whenever one of them changes (instead of
+# adding and subtracting the difference), such that no floating-point residue accumulates over many add/remove cycles
+class ResourceLedger:
+    def __init__(self, overlay=None):
+        self.instance_resources = {}				# instance: (consumed cpu, consumed mem)
+        self.node_instances = defaultdict(dict)		# node: instances at the node (dict as insertion-ordered set)
+        self.node_cpu = defaultdict(int)			# node: total consumed cpu
+        self.node_mem = defaultdict(int)
+        self.node_components = defaultdict(Counter)	# node: number of instances per component (for idle consumption)
+        self.edge_links = {}						# edge: (dr per traversed link, traversed links)
+        self.link_edges = defaultdict(Counter)		# link: number of traversals per edge
+        self.link_dr = defaultdict(int)				# link: total consumed dr
+        self.state = next(states)
+        journal.created(self)
+
+        if overlay is not None:
+            for i in overlay.instances:
+                self.add_instance(i)
+            for e in overlay.edges:
+                self.add_edge(e)
+
+    # return a copy for a copied overlay (with equal instances and edges); instances and edges are compared by value
+    def copy(self):
+        new_ledger = ResourceLedger()
+        new_ledger.__dict__.update(self.journal_state())
+        return new_ledger
+
+    # copy of all attributes, incl. the nested counters (for copies and the undo journal)
+    def journal_state(self):
+        return {
+            "instance_resources": dict(self.instance_resources),
+            "node_instances": defaultdict(dict, {v: dict(i) for v, i in self.node_instances.items()}),
+            "node_cpu": defaultdict(int, self.node_cpu),
+            "node_mem": defaultdict(int, self.node_mem),
+            "node_components": defaultdict(Counter, {v: Counter(c) for v, c in self.node_components.items()}),
+            "edge_links": dict(self.edge_links),
+            "link_edges": defaultdict(Counter, {l: Counter(e) for l, e in self.link_edges.items()}),
+            "link_dr": defaultdict(int, self.link_dr),
+            "state": self.state
+        }
+
+    def add_instance(self, instance):
+        if instance in self.instance_resources:
+            self.update_instance(instance)
+            return
+        journal.save(self)
+        self.state = next(states)
+        self.instance_resources[instance] = (instance.consumed_cpu(), instance.consumed_mem())
+        self.node_instances[instance.location][instance] = None
+        self.node_components[instance.location][instance.component] += 1
+        self.sum_node(instance.location)
+
+    def remove_instance(self, instance):
+        if instance not in self.instance_resources:
+            return
+        journal.save(self)
+        self.state = next(states)
+        del self.instance_resources[instance]
+        del self.node_instances[instance.location][instance]
+        self.node_components[instance.location][instance.component] -= 1
+        self.sum_node(instance.location)
+
+    # update the consumption of a tracked instance after the data rate of its ingoing edges changed
+    def update_instance(self, instance):
+        if instance not in self.instance_resources:
+            return
+        old_cpu, old_mem = self.instance_resources[instance]
+        cpu, mem = instance.consumed_cpu(), instance.consumed_mem()
+        if (cpu, mem) != (old_cpu, old_mem):
+            journal.save(self)
+            self.state = next(states)
+            self.instance_resources[instance] = (cpu, mem)
+            self.sum_node(instance.location)
+
+    # the edge dr is split equally among all paths; connections on the same node don't use any link
+    def add_edge(self, edge):
+        if edge in self.edge_links:
+            self.update_edge(edge)
+            return
+        journal.save(self)
+        self.state = next(states)
+        link_dr = edge.flow_dr() / len(edge.paths) if edge.paths else 0
+        edge_links = [(path[k], path[k + 1]) for path in edge.paths for k in range(len(path) - 1)
+                      if path[k] != path[k + 1]]
+        self.edge_links[edge] = (link_dr, edge_links)
+        for l in edge_links:
+            self.link_edges[l][edge] += 1
+        for l in set(edge_links):
+            self.sum_link(l)
+
+    def remove_edge(self, edge):
+        if edge not in self.edge_links:
+            return
+        journal.save(self)
+        self.state = next(states)
+        _, edge_links = self.edge_links.pop(edge)
+        for l in set(edge_links):
+            del self.link_edges[l][edge]
+            self.sum_link(l)
+
+    # sum the consumed cpu and mem at the node over all its instances
+    def sum_node(self, node):
+        resources = [self.instance_resources[i] for i in self.node_instances[node]]
+        self.node_cpu[node] = sum(cpu for cpu, _ in resources)
+        self.node_mem[node] = sum(mem for _, mem in resources)
+
+    # sum the consumed dr of the link over all edges traversing it (once per traversal)
+    def sum_link(self, link):
+        self.link_dr[link] = sum(self.edge_links[e][0] for e, num in self.link_edges[link].items() for _ in range(num))
+
+    # update the link dr of a tracked edge after flows were (un)mapped or their dr changed
+    def update_edge(self, edge):
+        if edge in self.edge_links:
+            self.remove_edge(edge)
+            self.add_edge(edge)
+
+    # return consumed cpu and mem at the specified node
+    # ignore the idle cpu/mem consumption of the instances of component specified in ignore_idle
+    def consumed(self, node, ignore_idle=None):
+        cpu, mem = self.node_cpu.get(node, 0), self.node_mem.get(node, 0)
+        if ignore_idle is not None and node in self.node_components:
+            num_idle = self.node_components[node][ignore_idle]
+            if num_idle > 0:
+                cpu -= num_idle * ignore_idle.cpu[-1]
+                mem -= num_idle * ignore_idle.mem[-1]
+        return cpu, mem
@@ -1,60 +1,107 @@
-import copy
-
+from bjointsp.overlay import journal
+from bjointsp.overlay.containers import InstanceCollection, EdgeCollection
 from bjointsp.overlay.edge import Edge
 from bjointsp.overlay.flow import Flow
 from bjointsp.overlay.instance import Instance
+from bjointsp.overlay.ledger import ResourceLedger
 
 
 class Overlay:
     def __init__(self, template, instances, edges):
         self.template = template
-        self.instances = instances
-        self.edges = edges
+        # insertion-ordered (deterministic iteration) and indexed collections
+        self.instances = InstanceCollection(instances)
+        self.edges = EdgeCollection(edges)
+        self._ledger = None
+        journal.created(self)
+
+    # state for the undo journal: copies of the collections (the ledger is journaled separately)
+    def journal_state(self):
+        return {"template": self.template, "instances": self.instances.copy(), "edges": self.edges.copy(),
+                "_ledger": self._ledger}
+
+    # ledger of consumed resources; built from all instances and edges on first access (or after reset_ledger)
+    # afterwards, it has to be updated with every change of instances, edges, or mapped flows
+    @property
+    def ledger(self):
+        if self._ledger is None:
+            journal.save(self)
+            self._ledger = ResourceLedger(self)
+        return self._ledger
+
+    # discard the ledger after modifying instances, edges, or flows without updating it, e.g., when (re)building overlays
+    def reset_ledger(self):
+        journal.save(self)
+        self._ledger = None
 
     # deepcopy by 1. copying plain instances and flows, 2. adding copies of the edges, 3. mapping new flows to new edges
     def __deepcopy__(self, memodict={}):
         new_overlay = Overlay(self.template, [], [])		# empty overlay
-        instance_dict = {}			# dict of old to new instances; for easy access when adding the edges
-        flow_dict = {}				# same for old to new flows
+        new_overlay.__setstate__(self.__getstate__())
 
-        # add new instances with same attributes (component, etc) but without edges_in/out
+        # the copy consumes the same resources
+        if self._ledger is not None:
+            new_overlay._ledger = self._ledger.copy()
+
+        return new_overlay
+
+    # flat state of the overlay (also used for pickling, eg, to return overlays from worker processes)
+    # instances with their src_flows and edges in topological order with their flows (by id) instead of references
+    def __getstate__(self):
+        instances = []
         for i in self.instances:
-            # copy src_flows
-            new_src_flows = None
+            src_flows = None
             if i.src_flows:
+                src_flows = [(f.id, f.src_dr) for f in i.src_flows]
+            instances.append((i.component, i.location, src_flows, i.fixed))
+
+        instance_index = {i: k for k, i in enumerate(self.instances)}
+        edges = []
+        for e in self.topological_order(True):
+            flows = [(f.id, f.dr[e]) for f in e.flows]
+            edges.append((e.arc, instance_index[e.source], instance_index[e.dest], e.direction, e.paths, flows))
+
+        return self.template, instances, edges
+
+    # restore the overlay from its flat state with new instances, edges, and flows
+    def __setstate__(self, state):
+        template, instances, edges = state
+        self.template = template
+        new_instances = []
+        self._ledger = None
+        flow_dict = {}				# flow id: new flow
+
+        # add new instances with same attributes (component, etc) but without edges_in/out
+        for component, location, src_flows, fixed in instances:
+            new_src_flows = None
+            if src_flows is not None:
                 new_src_flows = []
-                for f in i.src_flows:
-                    new_flow = Flow(f.id, f.src_dr)
-                    flow_dict[f] = new_flow
+                for flow_id, src_dr in src_flows:
+                    new_flow = Flow(flow_id, src_dr)
+                    flow_dict[flow_id] = new_flow
                     new_src_flows.append(new_flow)
-            # copy instances
-            new_instance = Instance(i.component, i.location, new_src_flows, i.fixed)
-            new_overlay.instances.append(new_instance)
-            instance_dict[i] = new_instance
+            new_instances.append(Instance(component, location, new_src_flows, fixed))
+        self.instances = InstanceCollection(new_instances)
+        self.edges = EdgeCollection()
 
         # add new edges in topological order => sets edges_in/out etc automatically
-        for e in self.topological_order(True):
-            # source/dest from new_overlay's instances using the instance_dict
-            new_source = instance_dict[e.source]
-            new_dest = instance_dict[e.dest]
-            # create new edge with references to the new instances and manually set the remaining attributes
-            new_edge = Edge(e.arc, new_source, new_dest)
-            new_edge.direction = e.direction
-            new_edge.paths = copy.deepcopy(e.paths, memodict)		# deepcopy for copying list of lists
-
-            # copy and update flows
-            for f in e.flows:
-                new_flow = flow_dict[f]
+        for arc, source, dest, direction, paths, flows in edges:
+            new_edge = Edge(arc, new_instances[source], new_instances[dest])
+            new_edge.direction = direction
+            new_edge.paths = list(paths)		# paths are immutable tuples and can be shared
+
+            # map new flows to the new edge
+            for flow_id, dr in flows:
+                new_flow = flow_dict[flow_id]
                 new_edge.flows.append(new_flow)
-                new_flow.dr[new_edge] = f.dr[e]
+                new_flow.dr[new_edge] = dr
                 if new_edge.source.component.stateful:
                     new_flow.passed_stateful[new_edge.source.component] = new_edge.source
                 elif new_edge.dest.component.stateful:
                     new_flow.passed_stateful[new_edge.dest.component] = new_edge.dest
+            new_edge.invalidate()
 
-            new_overlay.edges.append(new_edge)
-
-        return new_overlay
+            self.edges.append(new_edge)
 
     # return whether the overlay is empty, i.e., has no instances and no edges
     def empty(self):
@@ -76,15 +123,16 @@ class Overlay:
 
             # add source instances independent of their ingoing edges
             if j.source:
-                curr_instances = [i for i in self.instances if i.component == j]
+                curr_instances = self.instances.of_component(j)
             # add corresponding instances with ingoing edges in the curr direction or no edges (removed by heuristic)
             else:
-                curr_instances = [i for i in self.instances if i.component == j and (i.used(direction, self)
-                                                                                     or not i.edges_in)]
+                curr_instances = [i for i in self.instances.of_component(j) if i.used(direction, self)
+                                  or not i.edges_in]
             instance_order += curr_instances
 
             # add ingoing edges of current direction to edge_order
-            curr_edges = [e for e in self.edges if e.dest in curr_instances and e.direction == direction]
+            curr_instance_set = set(curr_instances)
+            curr_edges = [e for e in self.edges if e.dest in curr_instance_set and e.direction == direction]
             edge_order += curr_edges
 
         if return_edges:
@@ -0,0 +1,96 @@
+from bisect import bisect_left
+
+
+# topological order of an overlay's instances (same as overlay.topological_order()), maintained incrementally while the
+# heuristic (re-)embeds the overlay instead of recomputing it from scratch in each step
+# the order consists of one segment per component (and direction) in the template's topological component order; each
+# segment lists the corresponding instances in the order of overlay.instances. whether an instance belongs to a segment
+# only depends on its ingoing edges (and their flows), so only the instances affected by a step are checked again
+class TopologicalWorklist:
+    def __init__(self, overlay):
+        self.overlay = overlay
+        self.segments = []		# [component, direction, positions, instances] in topological order
+        self.positions = {}		# id(instance): (position in overlay.instances (only increasing), instance)
+        self.next_position = 0
+
+        # create segments like overlay.topological_order() (switch direction after last end component)
+        direction = "forward"
+        end_reached = False
+        self.component_segments = {}		# component: its segments (up to one per direction)
+        for j in overlay.template.topological_component_order():
+            if j.end:
+                end_reached = True
+            if end_reached and not j.end:
+                direction = "backward"
+            segment = [j, direction, [], []]
+            self.segments.append(segment)
+            self.component_segments.setdefault(j, []).append(segment)
+
+        for i in overlay.instances:
+            self.add(i)
+
+    def __len__(self):
+        return sum(len(segment[3]) for segment in self.segments)
+
+    def __getitem__(self, index):
+        for segment in self.segments:
+            if index < len(segment[3]):
+                return segment[3][index]
+            index -= len(segment[3])
+        raise IndexError("Index {} out of topological order".format(index))
+
+    # add an instance that was appended to overlay.instances
+    def add(self, instance):
+        self.positions[id(instance)] = (self.next_position, instance)
+        self.next_position += 1
+        self.check(instance)
+
+    # remove an instance that was removed from overlay.instances
+    def remove(self, instance):
+        if id(instance) not in self.positions:
+            return
+        position = self.positions.pop(id(instance))[0]
+        for segment in self.component_segments.get(instance.component, []):
+            self.remove_from(segment, position)
+
+    # update the order after the specified instances' ingoing edges (or their flows) may have changed
+    # instances that were appended to overlay.instances in the meantime are added automatically
+    def update(self, instances):
+        new_instances = []
+        for i in reversed(self.overlay.instances):
+            if id(i) in self.positions:
+                break
+            new_instances.append(i)
+        for i in reversed(new_instances):
+            self.add(i)
+
+        for i in instances:
+            if id(i) in self.positions:
+                self.check(i)
+
+    # add or remove the instance from the segments of its component depending on its ingoing edges
+    def check(self, instance):
+        position = self.positions[id(instance)][0]
+        for segment in self.component_segments.get(instance.component, []):
+            j, direction = segment[0], segment[1]
+            # source instances independent of their ingoing edges; others with ingoing edges in the direction or none
+            if j.source or instance.used(direction, self.overlay) or not instance.edges_in:
+                self.insert_into(segment, position, instance)
+            else:
+                self.remove_from(segment, position)
+
+    @staticmethod
+    def insert_into(segment, position, instance):
+        positions, instances = segment[2], segment[3]
+        k = bisect_left(positions, position)
+        if k == len(positions) or positions[k] != position:
+            positions.insert(k, position)
+            instances.insert(k, instance)
+
+    @staticmethod
+    def remove_from(segment, position):
+        positions, instances = segment[2], segment[3]
+        k = bisect_left(positions, position)
+        if k < len(positions) and positions[k] == position:
+            del positions[k]
+            del instances[k]
@@ -53,22 +53,14 @@ def update_stateful(template):
 def read_networkx(networkx, cap='cap'):
     # read nodes: use same cap for cpu and mem (no distinction in the simulator)
     node_ids = [v for v in networkx.nodes.keys()]
-    node_cpu = {v[0]: v[1][cap] for v in networkx.nodes.data()}
-    nodes = Nodes(node_ids, node_cpu, node_cpu.copy())
+    node_cpu = [v[1][cap] for v in networkx.nodes.data()]
+    nodes = Nodes(node_ids, node_cpu, node_cpu)
 
-    # read edges
-    link_ids = [e for e in networkx.edges.keys()]
-    link_dr = {(e[0], e[1]): e[2][cap] for e in networkx.edges.data()}
-    link_delay = {(e[0], e[1]): e[2]['delay'] for e in networkx.edges.data()}
-
-    # add reversed links for bidirectionality
-    for e in networkx.edges:
-        e_reversed = (e[1], e[0])
-        link_ids.append(e_reversed)
-        link_dr[e_reversed] = link_dr[e]
-        link_delay[e_reversed] = link_delay[e]
-
-    links = Links(link_ids, link_dr, link_delay)
+    # read edges and add reversed links for bidirectionality
+    link_ids = [(e[0], e[1]) for e in networkx.edges.data()]
+    link_dr = [e[2][cap] for e in networkx.edges.data()]
+    link_delay = [e[2]['delay'] for e in networkx.edges.data()]
+    links = Links.bidirectional(link_ids, link_dr, link_delay)
 
     return nodes, links
 
@@ -100,19 +92,19 @@ def read_network(file, cpu=None, mem=None, dr=None):
         except KeyError:
             raise ValueError("No CPU or mem. specified for {} (as cmd argument or in graphml)".format(file))
 
-    # set links
+    # set links (in the order of network.edges)
     link_ids = [("pop{}".format(e[0]), "pop{}".format(e[1])) for e in network.edges]
     if dr is not None:
-        link_dr = {("pop{}".format(e[0]), "pop{}".format(e[1])): dr for e in network.edges}
+        link_dr = [dr] * len(link_ids)
     else:
         dr = nx.get_edge_attributes(network, 'dr')
         try:
-            link_dr = {("pop{}".format(e[0]), "pop{}".format(e[1])): dr[e] for e in network.edges}
+            link_dr = [dr[e] for e in network.edges]
         except KeyError:
             raise ValueError("No link data rate specified for {} (as cmd argument or in graphml)".format(file))
 
-    # calculate link delay based on geo positions of nodes; duplicate links for bidirectionality
-    link_delay = {}
+    # calculate link delay based on geo positions of nodes
+    link_delay = []
     for e in network.edges(data=True):
         delay = 0
         if e[2].get("LinkDelay"):
@@ -125,18 +117,11 @@ def read_network(file, cpu=None, mem=None, dr=None):
             distance = geodesic((n1_lat, n1_long), (n2_lat, n2_long)).meters  # in meters
             delay = (distance / SPEED_OF_LIGHT * 1000) * PROPAGATION_FACTOR  # in milliseconds
         # round delay to int using np.around for consistency with emulator
-        link_delay[("pop{}".format(e[0]), "pop{}".format(e[1]))] = int(np.around(delay))
+        link_delay.append(int(np.around(delay)))
 
     # add reversed links for bidirectionality
-    for e in network.edges:
-        e = ("pop{}".format(e[0]), "pop{}".format(e[1]))
-        e_reversed = (e[1], e[0])
-        link_ids.append(e_reversed)
-        link_dr[e_reversed] = link_dr[e]
-        link_delay[e_reversed] = link_delay[e]
-
     nodes = Nodes(node_ids, node_cpu, node_mem)
-    links = Links(link_ids, link_dr, link_delay)
+    links = Links.bidirectional(link_ids, link_dr, link_delay)
     return nodes, links
 
 
@@ -275,9 +260,12 @@ def read_prev_placement(networkx, templates):
 
 
 # read previous embedding from yaml file
-def read_prev_embedding(file, templates, nodes, links):
-    # create shortest paths
-    shortest_paths = sp.all_pairs_shortest_paths(nodes, links)
+def read_prev_embedding(file, templates, nodes, links, sp_engine=sp.NUMPY, sp_cache=None, sp_dynamic=None):
+    # create shortest paths (or load them from the cache or reuse them from a previous call)
+    if sp_dynamic is not None:
+        shortest_paths = sp_dynamic.get(nodes, links)
+    else:
+        shortest_paths = sp.all_pairs_shortest_paths(nodes, links, sp_engine, sp_cache)
     # create empty overlays for all templates
     prev_embedding = {}  # dict: template -> overlay
     for t in templates:
@@ -321,10 +309,10 @@ def read_prev_embedding(file, templates, nodes, links):
             for t in templates:
                 if source.component in t.components and dest.component in t.components:
                     # assume t has an arc source->dest if both components are in t
-                    arc = list(filter(lambda x: x.source == source.component and x.dest == dest.component, t.arcs))[0]
+                    arc = t.index.arcs_from_to(source.component, dest.component)[0]
                     # add new edge to overlay of corresponding template
                     edge = Edge(arc, source, dest)
                     prev_embedding[t].edges.append(edge)
-                    edge.paths.append(shortest_paths[(source.location, dest.location)][0])
+                    edge.paths.append(shortest_paths.path(source.location, dest.location))
 
     return prev_embedding
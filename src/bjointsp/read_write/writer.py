@@ -1,10 +1,11 @@
 import os
 import networkx as nx
+import numpy as np
 import yaml
 import logging
-from collections import defaultdict
 from datetime import datetime
 from bjointsp.heuristic import shortest_paths as sp
+from bjointsp.network.links import LinkIncidence
 
 logger = logging.getLogger('bjointsp')
 
@@ -38,23 +39,32 @@ def create_result_file(input_files, subfolder, seed=None, seed_subfolder=False,
     return result_path
 
 
-# calculates end to end delay for every flow
-def save_end2end_delay(edges, links):
+# return the IDs of the original flows of the specified flow: the bundled flows if it is a bundle, else its own ID
+def flow_ids(flow, bundles=None):
+    if bundles is not None and flow.id in bundles:
+        return [flow_id for flow_id, _ in bundles[flow.id]]
+    return [flow.id]
+
+
+# calculates end to end delay for every flow (bundles are expanded to their flows)
+def save_end2end_delay(edges, links, bundles=None):
     flow_delays = {}
     for edge in edges:
         for flow in edge.flows:
-            if flow.id not in flow_delays:
-                flow_delays[flow.id] = 0
-            # adding vnf_delays of destinations
-            flow_delays[flow.id] += edge.dest.component.vnf_delay
-            # adding path delay
-            # path delays are always the shortest paths and hence the same, so just adding the one at 0th index.
-            flow_delays[flow.id] += sp.path_delay(links, edge.paths[0])
+            for flow_id in flow_ids(flow, bundles):
+                if flow_id not in flow_delays:
+                    flow_delays[flow_id] = 0
+                # adding vnf_delays of destinations
+                flow_delays[flow_id] += edge.dest.component.vnf_delay
+                # adding path delay
+                # path delays are always the shortest paths and hence the same, so just adding the one at 0th index.
+                flow_delays[flow_id] += sp.path_delay(links, edge.paths[0])
     return flow_delays
 
 
 # add variable values to the result dictionary
-def save_heuristic_variables(result, changed_instances, instances, edges, nodes, links):
+# bundles: dict bundle ID -> list of (flow ID, dr) of the bundled flows (if flows were bundled, see fixed.bundling)
+def save_heuristic_variables(result, changed_instances, instances, edges, nodes, links, bundles=None):
     # save placement
     result["placement"] = {"vnfs": [], "vlinks": []}
     for i in instances:
@@ -106,12 +116,12 @@ def save_heuristic_variables(result, changed_instances, instances, edges, nodes,
     result["metrics"]["max_endToEnd_delay"] = 0
     result['metrics']["total_delay"] = 0
     result["placement"]["links"] = []
-    consumed_dr = defaultdict(int)  # default = 0
     for e in edges:
         for f in e.flows:
-            flow = {"arc": str(e.arc), "src_node": e.source.location, "dst_node": e.dest.location,
-                    "src_vnf": e.source.component.name, "dest_vnf": e.dest.component.name, "flow_id": f.id}
-            result["placement"]["flows"].append(flow)
+            for flow_id in flow_ids(f, bundles):
+                flow = {"arc": str(e.arc), "src_node": e.source.location, "dst_node": e.dest.location,
+                        "src_vnf": e.source.component.name, "dest_vnf": e.dest.component.name, "flow_id": flow_id}
+                result["placement"]["flows"].append(flow)
         for path in e.paths:
             # record edge delay: all flows take the same (shortest) path => take path delay
             path_delay = {"src": e.arc.source.name, "dest": e.arc.dest.name, "src_node": e.source.location,
@@ -120,11 +130,10 @@ def save_heuristic_variables(result, changed_instances, instances, edges, nodes,
             result["metrics"]["total_path_delay"] += sp.path_delay(links, path)
             result["metrics"]["total_delay"] += sp.path_delay(links, path)
 
-            # go through nodes of each path and increase the dr of the traversed links
+            # go through nodes of each path and record the traversed links
             for i in range(len(path) - 1):
                 # skip connections on the same node (no link used)
                 if path[i] != path[i + 1]:
-                    consumed_dr[(path[i], path[i + 1])] += e.flow_dr() / len(e.paths)
                     link = {"arc": str(e.arc), "edge_src": e.source.location, "edge_dst": e.dest.location,
                             "link_src": path[i], "link_dst": path[i + 1]}
                     result["placement"]["links"].append(link)
@@ -138,87 +147,98 @@ def save_heuristic_variables(result, changed_instances, instances, edges, nodes,
     result["metrics"]["total_delay"] = result["metrics"]["total_path_delay"] + result["metrics"]["total_vnf_delay"]
 
     # record max end-to-end delay
-    endToEnd = save_end2end_delay(edges, links)
+    endToEnd = save_end2end_delay(edges, links, bundles)
     if endToEnd:
         result["metrics"]["max_endToEnd_delay"] = max(endToEnd.values())
     # for an empty placement, there is no end to end delay
     else:
         result["metrics"]["max_endToEnd_delay"] = 0
 
-    # link capacity violations
-    result["placement"]["dr_oversub"] = []
-    max_dr = 0
-    for l in links.ids:
-        if links.dr[l] < consumed_dr[l]:
-            result["placement"]["dr_oversub"].append({"link": list(l)})
-            if consumed_dr[l] - links.dr[l] > max_dr:
-                max_dr = consumed_dr[l] - links.dr[l]
-    result["metrics"]["max_dr_oversub"] = max_dr
+    # link capacity violations based on the dr of each link (sum of the dr of all edge paths traversing the link)
+    incidence = LinkIncidence(links)
+    over_dr = incidence.load(edges) - incidence.dr
+    result["placement"]["dr_oversub"] = [{"link": list(links.ids[k])} for k in np.flatnonzero(over_dr > 0)]
+    max_dr = np.max(over_dr, initial=0).item()
+    result["metrics"]["max_dr_oversub"] = max_dr if max_dr > 0 else 0		# 0 (int) like max_cpu/mem_oversub
 
     return result
 
 
-def write_heuristic_result(runtime, obj_value, changed, overlays, input_files, obj, nodes, links, seed, seed_subfolder,
-                           write_result, source_template_object):
-    if write_result:
-        result_file = create_result_file(input_files[0:4], "bjointsp", seed=seed, seed_subfolder=seed_subfolder, obj=obj)
-
-    instances, edges = set(), set()
-    for ol in overlays:
-        instances.update(ol.instances)
-        edges.update(ol.edges)
-
+# return the details of the inputs (file names, network size, etc) to simplify evaluation
+# reads the network, service, and sources files; build them once if writing multiple results for the same inputs
+def input_details(input_files, obj, seed, source_template_object):
     if not source_template_object:
         service = os.path.basename(input_files[1])
         sources = os.path.basename(input_files[2])
     else:
         service = input_files[1]['name']
         sources = 'source_object'
-    # construct result as dictionary for writing into YAML result file
-    result = {"time": datetime.now().strftime("%Y-%m-%d_%H-%M-%S"),
-              "input": {"network": os.path.basename(input_files[0]),
-                        "service": service,
-                        "sources": sources,
-                        "fixed": "None",
-                        "prev_embedding": "None",
-                        "seed": seed,
-                        "algorithm": "bjointsp",
-                        "objective": obj},
-              "metrics": {"runtime": runtime,
-                          "obj_value": obj_value}}
+    details = {"network": os.path.basename(input_files[0]),
+               "service": service,
+               "sources": sources,
+               "fixed": "None",
+               "prev_embedding": "None",
+               "seed": seed,
+               "algorithm": "bjointsp",
+               "objective": obj}
 
     # set file of fixed instances and of previous embedding if they are specified
     if input_files[3] is not None:
         # string path
         if isinstance(input_files[3], str):
-            result["input"]["fixed"] = os.path.basename(input_files[3])
+            details["fixed"] = os.path.basename(input_files[3])
         # list of dicts
         else:
-            result["input"]["fixed"] = str(input_files[3])
+            details["fixed"] = str(input_files[3])
     if input_files[4] is not None:
-        result["input"]["prev_embedding"] = os.path.basename(input_files[4])
+        details["prev_embedding"] = os.path.basename(input_files[4])
 
     # add input details to simplify evaluation: network size, etc
     network = nx.read_graphml(input_files[0])
-    result["input"]["num_nodes"] = network.number_of_nodes()
-    result["input"]["num_edges"] = network.number_of_edges()
+    details["num_nodes"] = network.number_of_nodes()
+    details["num_edges"] = network.number_of_edges()
     if source_template_object:
-        result["input"]["num_vnfs"] = len(input_files[1]["vnfs"])
+        details["num_vnfs"] = len(input_files[1]["vnfs"])
         sources = input_files[2]
         if sources is None:
             sources = []
-        result["input"]["num_sources"] = len(sources)
+        details["num_sources"] = len(sources)
     else:
         with open(input_files[1]) as f:
             service = yaml.load(f, yaml.SafeLoader)
-            result["input"]["num_vnfs"] = len(service["vnfs"])
+            details["num_vnfs"] = len(service["vnfs"])
         with open(input_files[2]) as f:
             sources = yaml.load(f, yaml.Loader)
             if sources is None:
                 sources = []
-            result["input"]["num_sources"] = len(sources)
+            details["num_sources"] = len(sources)
+    return details
+
+
+# start_results are the seed and objective value of each improvement trajectory (only with multi-start)
+# bundles are the bundled flows if flows were bundled (see fixed.bundling); they are expanded to the original flows
+# optionally, pass the input details (see input_details) to avoid reading the input files again for each result
+def write_heuristic_result(runtime, obj_value, changed, overlays, input_files, obj, nodes, links, seed, seed_subfolder,
+                           write_result, source_template_object, start_results=None, bundles=None, inputs=None):
+    if write_result:
+        result_file = create_result_file(input_files[0:4], "bjointsp", seed=seed, seed_subfolder=seed_subfolder, obj=obj)
+
+    instances, edges = set(), set()
+    for ol in overlays:
+        instances.update(ol.instances)
+        edges.update(ol.edges)
+
+    if inputs is None:
+        inputs = input_details(input_files, obj, seed, source_template_object)
+    # construct result as dictionary for writing into YAML result file
+    result = {"time": datetime.now().strftime("%Y-%m-%d_%H-%M-%S"),
+              "input": dict(inputs),
+              "metrics": {"runtime": runtime,
+                          "obj_value": obj_value}}
+    if start_results:
+        result["metrics"]["starts"] = start_results
 
-    result = save_heuristic_variables(result, changed, instances, edges, nodes, links)
+    result = save_heuristic_variables(result, changed, instances, edges, nodes, links, bundles)
 
     # If the write_result variable is True we write to a file and return its path
     # If the write_result variable is False we return the results dict
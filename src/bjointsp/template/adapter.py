@@ -5,22 +5,22 @@
 def check_consistency(components):
     for j1 in components:
         for j2 in components:		# compare all components
-            if j1 == j2 and j1.__dict__ != j2.__dict__:		# same name and reuseID but different other attributes
+            if j1 == j2 and j1.attributes() != j2.attributes():		# same name and reuseID but different other attributes
                 raise ValueError("Inconsistent definition of reused component {}.".format(j1))
 
 
-# check and return number of reuses
-def reuses(component, arcs):
+# check and return number of reuses (over all specified templates)
+def reuses(component, templates):
     # count number of reuses for each port
     times = set()  # set => no duplicates
     for k in range(component.inputs):
-        times.add(len([a for a in arcs if a.ends_in("forward", k, component)]))
+        times.add(sum(len(t.index.in_arcs(component, "forward", k)) for t in templates))
     for k in range(component.outputs):
-        times.add(len([a for a in arcs if a.starts_at("forward", k, component)]))
+        times.add(sum(len(t.index.out_arcs(component, "forward", k)) for t in templates))
     for k in range(component.inputs_back):
-        times.add(len([a for a in arcs if a.ends_in("backward", k, component)]))
+        times.add(sum(len(t.index.in_arcs(component, "backward", k)) for t in templates))
     for k in range(component.outputs_back):
-        times.add(len([a for a in arcs if a.starts_at("backward", k, component)]))
+        times.add(sum(len(t.index.out_arcs(component, "backward", k)) for t in templates))
 
     # check if each port was reused the same number of times (requirement/assumption)
     if len(times) != 1:
@@ -31,17 +31,12 @@ def reuses(component, arcs):
 
 # return adapted templates with adapted reused components and exactly one arc per port (allows proportional output)
 def adapt_for_reuse(templates):
-    # create set of components and arcs
-    arcs = []
-    for t in templates:
-        arcs += t.arcs
-
     # find reused components and adapt them
     component_reuses = {}					# dictionary with components-#reuses
     reused_components = []					# list of all reused components (contains duplicates) for consistency check
     for t in templates:
         for j in t.components:
-            uses = reuses(j, arcs)
+            uses = reuses(j, templates)
             if uses > 1:           			# used by >1 => reuse
                 if j.source:
                     raise ValueError("Source component {} cannot be reused".format(j))
@@ -71,4 +66,8 @@ def adapt_for_reuse(templates):
                     raise ValueError("Port offset {} too high. Should be < {} (#reuses).".format(port_offset, uses))
                 port_offset += 1
 
+    # ports of arcs were shifted => update the templates' indexes
+    for t in templates:
+        t.compile()
+
     return templates
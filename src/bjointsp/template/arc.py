@@ -1,4 +1,6 @@
 class Arc:
+    __slots__ = ("direction", "source", "src_out", "dest", "dest_in", "max_delay", "_hash")
+
     def __init__(self, direction, source, src_out, dest, dest_in, max_delay):
         self.direction = direction
         self.source = source
@@ -6,6 +8,17 @@ class Arc:
         self.dest = dest
         self.dest_in = dest_in
         self.max_delay = max_delay
+        # computed once; the ports are excluded as they are shifted when adapting templates for reuse
+        self._hash = hash((direction, source, dest))
+
+    # pickle without the hash, which is only valid within the process (computed again when unpickling)
+    def __getstate__(self):
+        return {key: getattr(self, key) for key in self.__slots__ if key != "_hash"}
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
+        self._hash = hash((self.direction, self.source, self.dest))
 
     def __str__(self):
         if self.direction == "forward":
@@ -19,9 +32,13 @@ class Arc:
         if self.direction == "backward":
             return str(self.dest) + "." + str(self.dest_in) + "<-" + str(self.source) + "." + str(self.src_out)
 
+    # equal iff all attributes are equal
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            if self is other:
+                return True
+            return (self.direction, self.source, self.src_out, self.dest, self.dest_in, self.max_delay) == \
+                   (other.direction, other.source, other.src_out, other.dest, other.dest_in, other.max_delay)
         return NotImplemented
 
     def __ne__(self, other):
@@ -30,7 +47,7 @@ class Arc:
         return NotImplemented
 
     def __hash__(self):
-        return hash(tuple(sorted(self.__dict__.items())))
+        return self._hash
 
     # whether arc with the specified direction ends in port of component
     def ends_in(self, direction, port, component):
@@ -1,6 +1,13 @@
+from bjointsp import interning
+
+
 class Component:
+    __slots__ = ("name", "id", "source", "end", "stateful", "inputs", "inputs_back", "outputs", "outputs_back", "cpu",
+                 "mem", "vnf_delay", "dr", "dr_back", "config")
+
     def __init__(self, name, type, stateful, inputs, outputs, cpu, mem, dr, vnf_delay=0, config=None):
         self.name = name
+        self.id = interning.components.id(name)		# interned name => compared and hashed instead of the name
         if type == "source":
             self.source = True
             self.end = False
@@ -36,16 +43,25 @@ class Component:
         if len(self.dr_back) != self.outputs_back:
             raise ValueError("Outputs and #outgoing data rate functions mismatch (backward direction)")
 
+    # pickle without the id, which is only valid within the process (interned again when unpickling)
+    def __getstate__(self):
+        return self.attributes()
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
+        self.id = interning.components.id(self.name)
+
     def __str__(self):
         return self.name
 
     def __repr__(self):
         return self.name
 
-    # equal iff same name (name includes reuseID, e.g., A1)
+    # equal iff same name (name includes reuseID, e.g., A1) <=> same id
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.name == other.name
+            return self.id == other.id
         return NotImplemented
 
     def __ne__(self, other):
@@ -54,7 +70,11 @@ class Component:
         return NotImplemented
 
     def __hash__(self):
-        return hash((self.name))
+        return self.id
+
+    # return all attributes defining the component (except its id)
+    def attributes(self):
+        return {key: getattr(self, key) for key in self.__slots__ if key != "id"}
 
     def print(self):
         if self.source:
@@ -0,0 +1,88 @@
+# group arcs by the specified key; return dict: key -> tuple of arcs (in order of arcs)
+def group(arcs, key):
+    groups = {}
+    for a in arcs:
+        groups.setdefault(key(a), []).append(a)
+    return {k: tuple(v) for k, v in groups.items()}
+
+
+# compiled index of a template's arcs for fast lookups by component, direction, and port (instead of scanning all arcs)
+# it is built once per template and not modified afterwards; if the arcs of a template change (e.g., ports shifted when
+# adapting templates for reuse), the template has to be compiled again
+class TemplateIndex:
+    def __init__(self, components, arcs):
+        self.arcs_out = group(arcs, lambda a: (a.source, a.direction, a.src_out))	# (component, direction, output)
+        self.arcs_in = group(arcs, lambda a: (a.dest, a.direction, a.dest_in))		# (component, direction, input)
+        self.component_out = group(arcs, lambda a: (a.source, a.direction))		# (component, direction)
+        self.component_in = group(arcs, lambda a: (a.dest, a.direction))			# (component, direction)
+        self.arcs_between = group(arcs, lambda a: (a.source, a.dest))				# (source, dest component)
+
+        source = None
+        for j in components:
+            if j.source:
+                source = j
+                break
+        self.topological_order = self.compute_topological_order(source)
+
+    # return the arcs starting at the specified output of the component in the specified direction
+    def out_arcs(self, component, direction, output):
+        return self.arcs_out.get((component, direction, output), ())
+
+    # return the arcs ending in the specified input of the component in the specified direction
+    def in_arcs(self, component, direction, input):
+        return self.arcs_in.get((component, direction, input), ())
+
+    # return all outgoing arcs of the component in the specified direction
+    def component_arcs_out(self, component, direction):
+        return self.component_out.get((component, direction), ())
+
+    # return all ingoing arcs of the component in the specified direction
+    def component_arcs_in(self, component, direction):
+        return self.component_in.get((component, direction), ())
+
+    # return the arcs from source to dest component (in any direction)
+    def arcs_from_to(self, source, dest):
+        return self.arcs_between.get((source, dest), ())
+
+    # start with source component and continue breadth-first style (first forward then backward direction)
+    def compute_topological_order(self, source):
+        # fwd_/bwd_order stores all ordered components (for each direction)
+        # curr_level stores the components of the current level/depth of the VNF-FG
+        fwd_order, bwd_order, curr_level = [], [], []
+
+        # start with source component
+        curr_level.append(source)
+        fwd_order.append(source)
+
+        # add remaining components by following the arcs of the components at the current level (forward)
+        while len(curr_level) > 0:
+            next_level = []
+            for j in curr_level:
+                for a in self.component_arcs_out(j, "forward"):
+                    next_level.append(a.dest)
+                    fwd_order.append(a.dest)
+            curr_level = next_level
+
+        # start backward direction with end components
+        curr_level = [j for j in fwd_order if j.end]
+        fwd_order += curr_level
+
+        # return in backward direction from end components
+        while len(curr_level) > 0:
+            next_level = []
+            for j in curr_level:
+                for a in self.component_arcs_out(j, "backward"):
+                    next_level.append(a.dest)
+                    bwd_order.append(a.dest)
+            curr_level = next_level
+
+        # remove possible duplicates within a direction
+        # always keeping the last one of each element to ensure that the order is correct
+        seen = set()
+        seen_add = seen.add
+        fwd_order = [j for j in fwd_order[::-1] if not (j in seen or seen_add(j))][::-1]
+        seen = set()
+        seen_add = seen.add
+        bwd_order = [j for j in bwd_order[::-1] if not (j in seen or seen_add(j))][::-1]
+
+        return tuple(fwd_order + bwd_order)
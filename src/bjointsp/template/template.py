@@ -1,20 +1,38 @@
 import logging
+from bjointsp import interning
+from bjointsp.template.index import TemplateIndex
 
 logger = logging.getLogger('bjointsp')
 
 
 class Template:
+    __slots__ = ("name", "id", "components", "arcs", "index")
+
     def __init__(self, name, components, arcs):
         self.name = name
+        self.id = interning.templates.id(name)		# interned name => hashed instead of the name
         self.components = components
         self.arcs = arcs
+        self.compile()
+
+    # pickle without the id, which is only valid within the process (interned again when unpickling)
+    def __getstate__(self):
+        return {key: getattr(self, key) for key in self.__slots__ if key != "id"}
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
+        self.id = interning.templates.id(self.name)
 
     def __str__(self):
         return self.name
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            if self is other:
+                return True
+            # the index is derived from the arcs and not compared
+            return self.id == other.id and self.components == other.components and self.arcs == other.arcs
         return NotImplemented
 
     def __ne__(self, other):
@@ -24,7 +42,7 @@ class Template:
 
     def __hash__(self):
         # all templates need unique names
-        return hash(self.name)
+        return self.id
 
     def print(self):
         print("Template " + self.name + ":")
@@ -39,6 +57,10 @@ class Template:
             string += str(arc) + ", "
         print(string)
 
+    # build the index for arc lookups and the topological order; has to be called again if the arcs are modified
+    def compile(self):
+        self.index = TemplateIndex(self.components, self.arcs)
+
     # return source component (assuming there is only one)
     def source(self):
         for component in self.components:
@@ -78,7 +100,7 @@ class Template:
                 in_dr_fwd = []
                 for k_in in range(j.inputs):
                     # get ingoing arc at k_in
-                    in_arcs = [a for a in self.arcs if a.dest == j and a.dest_in == k_in and a.direction == "forward"]
+                    in_arcs = self.index.in_arcs(j, "forward", k_in)
                     # if the component is adapted on the fly, k_in might belong to another template => set dr to 0
                     if len(in_arcs) == 0:
                         in_dr_fwd.append(0)
@@ -115,7 +137,7 @@ class Template:
                 in_dr_bwd = []
                 for k_in in range(j.inputs_back):
                     # get ingoing arc at k_in
-                    in_arcs = [a for a in self.arcs if a.dest == j and a.dest_in == k_in and a.direction == "backward"]
+                    in_arcs = self.index.in_arcs(j, "backward", k_in)
                     # if the component is adapted on the fly, k_in might belong to another template => set dr to 0
                     if len(in_arcs) == 0:
                         in_dr_bwd.append(0)
@@ -142,47 +164,6 @@ class Template:
         return total_cpu + total_mem + total_dr
 
     # start with source component and continue breadth-first style (first forward then backward direction)
-    # FUTURE WORK: set as property/constant such that it only has to be computed once (eg, in init)
+    # computed only once when the template is compiled
     def topological_component_order(self):
-        # fwd_/bwd_order stores all ordered components (for each direction)
-        # curr_level stores the components of the current level/depth of the VNF-FG
-        fwd_order, bwd_order, curr_level = [], [], []
-
-        # start with source component
-        curr_level.append(self.source())
-        fwd_order.append(self.source())
-
-        # add remaining components by following the arcs of the components at the current level (forward)
-        while len(curr_level) > 0:
-            next_level = []
-            for j in curr_level:
-                fwd_arcs_out = [a for a in self.arcs if a.source == j and a.direction == "forward"]
-                for a in fwd_arcs_out:
-                    next_level.append(a.dest)
-                    fwd_order.append(a.dest)
-            curr_level = next_level
-
-        # start backward direction with end components
-        curr_level = [j for j in fwd_order if j.end]
-        fwd_order += curr_level
-
-        # return in backward direction from end components
-        while len(curr_level) > 0:
-            next_level = []
-            for j in curr_level:
-                bwd_arcs_out = [a for a in self.arcs if a.source == j and a.direction == "backward"]
-                for a in bwd_arcs_out:
-                    next_level.append(a.dest)
-                    bwd_order.append(a.dest)
-            curr_level = next_level
-
-        # remove possible duplicates within a direction
-        # always keeping the last one of each element to ensure that the order is correct
-        seen = set()
-        seen_add = seen.add
-        fwd_order = [j for j in fwd_order[::-1] if not (j in seen or seen_add(j))][::-1]
-        seen = set()
-        seen_add = seen.add
-        bwd_order = [j for j in bwd_order[::-1] if not (j in seen or seen_add(j))][::-1]
-
-        return fwd_order + bwd_order
+        return list(self.index.topological_order)